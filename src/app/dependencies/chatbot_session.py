@@ -12,4 +12,4 @@ async def create_chatbot_session(
     session_id: Annotated[str, Depends(create_session)],
     persona: str = Query(default="Alice", description="The persona to greet"),
 ) -> Chatbot:
-    return CHATBOT_CACHE.get_or_create_session(session_id, persona)
+    return await CHATBOT_CACHE.get_or_create_session(session_id, persona)
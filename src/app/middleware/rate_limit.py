@@ -0,0 +1,60 @@
+import math
+
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.rate_limiter import in_flight_limiter, rate_limiter
+
+
+def rate_limit_key(connection: HTTPConnection) -> str:
+    # Without a session cookie a client would get a fresh session (and a fresh
+    # bucket) on every request, so those are limited per address instead.
+    session_id = connection.cookies.get("session_id")
+    if session_id:
+        return f"session:{session_id}"
+    return f"client:{connection.client.host if connection.client else 'unknown'}"
+
+
+def too_many_requests(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, paths: list):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        key = rate_limit_key(HTTPConnection(scope))
+
+        # The turn updates the chatbot while its reply is streamed, so the slot is
+        # held until the whole response has been sent. It's checked first so that an
+        # overlapping request doesn't also spend the session's rate budget.
+        if not in_flight_limiter.try_acquire(key):
+            response = too_many_requests(
+                "A previous request for this session is still in progress.", 1
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            retry_after = await rate_limiter.hit(key)
+            if retry_after > 0:
+                response = too_many_requests(
+                    "Too many requests, slow down.", retry_after
+                )
+                await response(scope, receive, send)
+                return
+
+            await self.app(scope, receive, send)
+        finally:
+            in_flight_limiter.release(key)
@@ -1,56 +1,336 @@
-import os
-from typing import List
+import asyncio
+import math
+import time
+from typing import List, Optional
 
-import aiofiles
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
 from app.dependencies.chatbot_session import create_chatbot_session
+from app.services.ai.audio_formats import (
+    AudioFormat,
+    join_ogg_opus_segments,
+    join_wav_segments,
+    negotiate_audio_format,
+)
+from app.services.ai.llm import llm_service
+from app.services.ai.resilience import llm_policy, stt_policy, tts_policy
+from app.services.ai.scheduler import (
+    llm_scheduler,
+    transcription_scheduler,
+    tts_scheduler,
+)
+from app.services.ai.streaming_vad import Endpointer, SpeechActivity, StreamingVAD
+from app.services.ai.tts_cache import tts_cache
+from app.services.chat_session_cache import CHATBOT_CACHE
 from app.services.chatbot import Chatbot
+from app.services.knowledge_base import knowledge_base
+from app.services.rate_limiter import in_flight_limiter, rate_limiter
+from app.services.speculation import SpeculativeTranscriber, speculation_stats
+from app.services.summary_queue import summary_queue
+from app.utils.metrics import observe_stage, stage_span
+from app.utils.multipart import read_upload
+from app.utils.startup import startup_report
 from config import settings
 
-from ..utils.ai_logger import logger as ai_logger
-
 router = APIRouter()
 
 
-def remove_headers(raw_bytes):
-    header_boundary = b"\r\n\r\n"
-    if header_boundary in raw_bytes:
-        return raw_bytes.split(header_boundary)[1]
-    else:
-        return raw_bytes
+class ChatMessage(BaseModel):
+    message: str
+
+
+def format_sse(data: str, event: str = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
 
 
 @router.post("/upload_stream")
 async def upload_audio_stream(
-    request: Request, chatbot: Chatbot = Depends(create_chatbot_session, use_cache=True)
+    request: Request,
+    chatbot: Chatbot = Depends(create_chatbot_session, use_cache=True),
+    requested_format: Optional[str] = Query(default=None, alias="format"),
+    accept: Optional[str] = Header(default=None),
 ):
+    audio_format = negotiate_audio_format(requested_format, accept)
     audio_data = []
+    streaming_vad = await StreamingVAD.start()
+    speculation = (
+        SpeculativeTranscriber(chatbot, filename="audio.ogg")
+        if settings.speculative_transcription
+        else None
+    )
+
+    try:
+        with stage_span("upload", chatbot.persona.name):
+            async for chunk in read_upload(
+                request, max_size=settings.upload_max_bytes, field_name="audio"
+            ):
+                audio_data.append(chunk)
+                if streaming_vad is not None:
+                    await streaming_vad.feed(chunk)
+                if speculation is not None:
+                    speculation.feed(chunk)
+
+        audio_stream = await process_audio_data(
+            audio_data,
+            chatbot=chatbot,
+            audio_format=audio_format,
+            streaming_vad=streaming_vad,
+            speculation=speculation,
+        )
+    finally:
+        if streaming_vad is not None:
+            streaming_vad.close()
+        if speculation is not None:
+            speculation.close()
 
-    async for chunk in request.stream():
-        audio_data.append(chunk)
+    if audio_format.name == "wav":
+        audio_stream = join_wav_segments(audio_stream)
+    elif audio_format.name == "opus":
+        audio_stream = join_ogg_opus_segments(audio_stream)
+    first_segment = await anext(audio_stream, b"")
 
-    output_filename = await process_audio_data(audio_data, chatbot=chatbot)
-    response = FileResponse(output_filename, media_type="audio/mpeg")
+    response = StreamingResponse(
+        timed_send(prepend_chunk(first_segment, audio_stream), chatbot),
+        media_type=audio_format.media_type,
+    )
     if request.cookies.get("persona") != chatbot.persona.name:
         response.set_cookie(key="persona", value=chatbot.persona.name)
     return response
 
 
-async def process_audio_data(audio_data: List[bytes], chatbot: Chatbot):
+async def prepend_chunk(first_chunk: bytes, stream):
+    yield first_chunk
+    async for chunk in stream:
+        yield chunk
+
+
+async def timed_send(stream, chatbot: Chatbot):
+    # Only the time the response spends writing chunks counts. Waiting for the
+    # next chunk is LLM and TTS work for later sentences, timed in their own stages.
+    sending = 0.0
+    try:
+        async for chunk in stream:
+            started = time.perf_counter()
+            yield chunk
+            sending += time.perf_counter() - started
+    finally:
+        observe_stage(
+            "response_send", chatbot.persona.name, chatbot.persona.voice, sending
+        )
+
+
+def collect_stats() -> dict:
+    return {
+        "llm": llm_service.stats(),
+        "schedulers": {
+            "llm": llm_scheduler.stats(),
+            "stt": transcription_scheduler.stats(),
+            "tts": tts_scheduler.stats(),
+        },
+        "resilience": {
+            "llm": llm_policy.stats(),
+            "stt": stt_policy.stats(),
+            "tts": tts_policy.stats(),
+        },
+        "sessions": CHATBOT_CACHE.stats(),
+        "summaries": summary_queue.stats(),
+        "tts_cache": tts_cache.stats(),
+        "knowledge_base": knowledge_base.stats(),
+        "speculation": speculation_stats.stats(),
+        "rate_limit": {
+            "requests": rate_limiter.stats(),
+            "in_flight": in_flight_limiter.stats(),
+        },
+        "startup": startup_report(),
+    }
+
+
+@router.get("/stats")
+async def stats():
+    return collect_stats()
+
+
+@router.post("/chat_stream")
+async def chat_stream(
+    chat_message: ChatMessage,
+    request: Request,
+    chatbot: Chatbot = Depends(create_chatbot_session, use_cache=True),
+):
+    async def event_stream():
+        try:
+            async for delta in chatbot.stream_respond(chat_message.message):
+                yield format_sse(delta)
+        except HTTPException as e:
+            yield format_sse(str(e.detail), event="error")
+            return
+        yield format_sse("", event="done")
+
+    response = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if request.cookies.get("persona") != chatbot.persona.name:
+        response.set_cookie(key="persona", value=chatbot.persona.name)
+    return response
+
+
+async def process_audio_data(
+    audio_data: List[bytes],
+    chatbot: Chatbot,
+    audio_format: AudioFormat,
+    streaming_vad: StreamingVAD = None,
+    speculation: SpeculativeTranscriber = None,
+):
     combined_audio = b"".join(audio_data)
-    return await save_and_process_audio(combined_audio, chatbot=chatbot)
 
+    speech_activity = None
+    if streaming_vad is not None:
+        with stage_span("vad", chatbot.persona.name, "silero"):
+            speech_activity = await streaming_vad.finish(
+                combined_audio, extension="ogg"
+            )
 
-async def save_and_process_audio(audio_bytes: bytes, chatbot: Chatbot):
-    cleaned_data = remove_headers(audio_bytes)
+    return await save_and_process_audio(
+        combined_audio,
+        chatbot=chatbot,
+        audio_format=audio_format,
+        speech_activity=speech_activity,
+        speculation=speculation,
+    )
 
-    input_filename = os.path.join(settings.media_path, f"temp_audio-{chatbot.user_id}.ogg")
-    async with aiofiles.open(input_filename, "wb") as f:
-        ai_logger.debug(f"User({chatbot.user_id}): Saving user's audio to {input_filename}")
-        await f.write(cleaned_data)
 
-    output_filename = await chatbot.voice_respond(input_filename)
+async def save_and_process_audio(
+    audio_bytes: bytes,
+    chatbot: Chatbot,
+    audio_format: AudioFormat,
+    speech_activity: SpeechActivity = None,
+    speculation: SpeculativeTranscriber = None,
+):
+    if speech_activity is None:
+        return await chatbot.voice_respond(
+            audio_bytes,
+            filename="audio.ogg",
+            audio_format=audio_format,
+            speculation=speculation,
+        )
+
+    if not speech_activity.speech_detected:
+        return await chatbot.voice_respond(
+            b"", filename=None, speech_detected=False, audio_format=audio_format
+        )
+
+    return await chatbot.voice_respond(
+        speech_activity.audio,
+        filename=f"audio.{speech_activity.extension}",
+        speech_detected=True,
+        audio_format=audio_format,
+        speculation=speculation,
+    )
+
+
+@router.websocket("/ws/voice")
+async def voice_websocket(
+    websocket: WebSocket,
+    chatbot: Chatbot = Depends(create_chatbot_session, use_cache=True),
+    requested_format: Optional[str] = Query(default=None, alias="format"),
+):
+    # Clients stream 16 kHz mono PCM16 frames; replies are sent back one complete
+    # audio file per sentence, with JSON text frames marking turn boundaries.
+    try:
+        audio_format = negotiate_audio_format(requested_format, None)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
 
-    return output_filename
+    if not Endpointer.is_available():
+        raise WebSocketException(
+            code=status.WS_1011_INTERNAL_ERROR,
+            reason="Voice activity detection is not available.",
+        )
+
+    await websocket.accept()
+    endpointer = Endpointer(
+        silence_seconds=settings.voice_ws_silence_seconds,
+        max_utterance_seconds=settings.voice_ws_max_utterance_seconds,
+        max_idle_seconds=settings.voice_ws_max_idle_seconds,
+    )
+    reply = None
+    receive = asyncio.create_task(websocket.receive_bytes())
+    endpoint = asyncio.create_task(endpointer.next_utterance())
+
+    try:
+        while True:
+            # Wait on the endpointer too: it can find the end of an utterance after
+            # the client has gone quiet and stopped sending frames.
+            await asyncio.wait({receive, endpoint}, return_when=asyncio.FIRST_COMPLETED)
+            if receive.done():
+                endpointer.feed(receive.result())
+                receive = asyncio.create_task(websocket.receive_bytes())
+
+            # Barge-in: the user started talking over the reply, so drop it.
+            if reply is not None and not reply.done() and endpointer.speaking:
+                reply.cancel()
+                await websocket.send_json({"type": "interrupted"})
+
+            if endpoint.done():
+                utterance = endpoint.result()
+                endpoint = asyncio.create_task(endpointer.next_utterance())
+                if reply is not None:
+                    reply.cancel()
+                await websocket.send_json({"type": "utterance_end"})
+
+                # Each utterance costs a full STT, LLM and TTS round, like an upload.
+                retry_after = await rate_limiter.hit(f"session:{chatbot.user_id}")
+                if retry_after > 0:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "detail": "Too many requests, slow down.",
+                            "retry_after": math.ceil(retry_after),
+                        }
+                    )
+                    continue
+                reply = asyncio.create_task(
+                    stream_voice_reply(websocket, chatbot, utterance, audio_format)
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receive.cancel()
+        endpoint.cancel()
+        endpointer.close()
+        if reply is not None:
+            reply.cancel()
+
+
+async def stream_voice_reply(
+    websocket: WebSocket, chatbot: Chatbot, utterance: bytes, audio_format: AudioFormat
+):
+    try:
+        audio_stream = await chatbot.voice_respond(
+            utterance,
+            filename="audio.wav",
+            speech_detected=True,
+            audio_format=audio_format,
+        )
+        async for segment in audio_stream:
+            await websocket.send_bytes(segment)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": str(e.detail)})
+        return
+    await websocket.send_json({"type": "reply_end"})
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.routers.api import collect_stats
+from app.utils.metrics import render_gauges, stage_duration
+
+router = APIRouter(include_in_schema=False)
+
+
+@router.get("/metrics")
+async def metrics():
+    lines = [*stage_duration.render(), *render_gauges("voicebot", collect_stats())]
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,288 @@
+import io
+import struct
+import wave
+from typing import AsyncIterator, Iterator, List, Optional
+
+from fastapi import HTTPException
+
+from app.utils.capabilities import lazy_import
+from config import settings
+
+tts = lazy_import("google.cloud.texttospeech")
+
+
+class AudioFormat:
+    def __init__(
+        self,
+        name: str,
+        encoding_name: str,
+        media_type: str,
+        extension: str,
+        aliases: tuple = (),
+    ):
+        self.name = name
+        self.encoding_name = encoding_name
+        self.media_type = media_type
+        self.extension = extension
+        self.aliases = aliases
+
+    @property
+    def encoding(self) -> "tts.AudioEncoding":
+        return tts.AudioEncoding[self.encoding_name]
+
+    def __repr__(self) -> str:
+        return f"<AudioFormat: {self.name} ({self.media_type})>"
+
+
+AUDIO_FORMATS = {
+    audio_format.name: audio_format
+    for audio_format in (
+        AudioFormat(
+            "opus",
+            "OGG_OPUS",
+            "audio/ogg",
+            "ogg",
+            aliases=("ogg_opus", "audio/ogg", "audio/opus"),
+        ),
+        AudioFormat(
+            "mp3",
+            "MP3",
+            "audio/mpeg",
+            "mp3",
+            aliases=("audio/mpeg", "audio/mp3"),
+        ),
+        AudioFormat(
+            "wav",
+            "LINEAR16",
+            "audio/wav",
+            "wav",
+            aliases=("linear16", "audio/wav", "audio/wave", "audio/x-wav"),
+        ),
+    )
+}
+
+AUDIO_FORMAT_ALIASES = {
+    alias: audio_format
+    for audio_format in AUDIO_FORMATS.values()
+    for alias in (audio_format.name, *audio_format.aliases)
+}
+
+
+def negotiate_audio_format(
+    requested: Optional[str], accept: Optional[str]
+) -> AudioFormat:
+    if requested:
+        audio_format = AUDIO_FORMAT_ALIASES.get(requested.lower())
+        if audio_format is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported audio format '{requested}', expected one of: {', '.join(AUDIO_FORMATS)}",
+            )
+        return audio_format
+
+    candidates = []
+    for position, media_range in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        audio_format = AUDIO_FORMAT_ALIASES.get(media_type.lower())
+        if audio_format is not None and quality > 0:
+            candidates.append((-quality, position, audio_format))
+
+    if candidates:
+        return min(candidates, key=lambda candidate: candidate[:2])[2]
+    return AUDIO_FORMATS[settings.tts_default_audio_format]
+
+
+def streaming_wav_header(channels: int, sample_width: int, sample_rate: int) -> bytes:
+    # The total length isn't known while segments are still being synthesized, so
+    # the RIFF and data sizes are set to the maximum, as is usual for streamed WAV.
+    byte_rate = sample_rate * channels * sample_width
+    return (
+        b"RIFF"
+        + struct.pack("<I", 0xFFFFFFFF)
+        + b"WAVEfmt "
+        + struct.pack(
+            "<IHHIIHH",
+            16,
+            1,
+            channels,
+            sample_rate,
+            byte_rate,
+            channels * sample_width,
+            sample_width * 8,
+        )
+        + b"data"
+        + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+async def join_wav_segments(segments: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Each synthesized sentence is a complete WAV file; concatenated as-is, every
+    # header after the first would be played back as a click of noise.
+    header_sent = False
+    async for segment in segments:
+        if not segment:
+            continue
+        with wave.open(io.BytesIO(segment), "rb") as wav_file:
+            if not header_sent:
+                yield streaming_wav_header(
+                    wav_file.getnchannels(),
+                    wav_file.getsampwidth(),
+                    wav_file.getframerate(),
+                )
+                header_sent = True
+            yield wav_file.readframes(wav_file.getnframes())
+
+
+OGG_CAPTURE = b"OggS"
+OGG_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+OGG_BOS = 0x02
+OGG_EOS = 0x04
+# Opus frame durations in 48 kHz samples, indexed by the TOC byte's config number.
+OPUS_FRAME_SAMPLES = (
+    [480, 960, 1920, 2880] * 3 + [480, 960] * 2 + [120, 240, 480, 960] * 4
+)
+
+
+def ogg_crc_table() -> List[int]:
+    table = []
+    for index in range(256):
+        crc = index << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+OGG_CRC_TABLE = ogg_crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+class OggPage:
+    def __init__(
+        self, flags: int, granule: int, serial: int, lacing: bytes, body: bytes
+    ):
+        self.flags = flags
+        self.granule = granule
+        self.serial = serial
+        self.lacing = lacing
+        self.body = body
+
+    def __repr__(self) -> str:
+        return f"<OggPage: granule={self.granule}, {len(self.body)} bytes>"
+
+    def packets(self) -> Iterator[bytes]:
+        # Yields the packets that end on this page; a packet continued from the
+        # previous page only contributes its tail.
+        start = end = 0
+        for size in self.lacing:
+            end += size
+            if size < 255:
+                yield self.body[start:end]
+                start = end
+
+    def encode(self, sequence: int) -> bytes:
+        header = OGG_PAGE_HEADER.pack(
+            OGG_CAPTURE,
+            0,
+            self.flags,
+            self.granule,
+            self.serial,
+            sequence,
+            0,
+            len(self.lacing),
+        )
+        page = header + self.lacing + self.body
+        crc = ogg_crc(page)
+        return page[:22] + struct.pack("<I", crc) + page[26:]
+
+
+def parse_ogg_pages(data: bytes) -> Iterator[OggPage]:
+    offset = 0
+    while offset < len(data):
+        capture, _, flags, granule, serial, _, _, count = OGG_PAGE_HEADER.unpack_from(
+            data, offset
+        )
+        if capture != OGG_CAPTURE:
+            raise ValueError("Not an Ogg page")
+        offset += OGG_PAGE_HEADER.size
+        lacing = data[offset : offset + count]
+        offset += count
+        size = sum(lacing)
+        yield OggPage(flags, granule, serial, lacing, data[offset : offset + size])
+        offset += size
+
+
+def opus_packet_samples(packet: bytes) -> int:
+    if not packet:
+        return 0
+    toc = packet[0]
+    frames = toc & 0x03
+    if frames == 3:
+        count = packet[1] & 0x3F if len(packet) > 1 else 0
+    else:
+        count = 1 if frames == 0 else 2
+    return OPUS_FRAME_SAMPLES[toc >> 3] * count
+
+
+async def join_ogg_opus_segments(
+    segments: AsyncIterator[bytes],
+) -> AsyncIterator[bytes]:
+    # Each synthesized sentence is a complete Ogg Opus file. Chained files are valid
+    # Ogg, but many players stop after the first, so the audio pages are rewritten
+    # into the first file's logical stream: one serial number, one page sequence,
+    # granule positions that keep counting, and a single end-of-stream page.
+    serial = None
+    sequence = 0
+    offset = 0
+    held = None
+    end_granule = 0
+
+    async for segment in segments:
+        if not segment:
+            continue
+
+        keep_headers = serial is None
+        headers = 0
+        samples = 0
+        for page in parse_ogg_pages(segment):
+            if headers < 2:
+                # OpusHead and OpusTags; later files' copies are dropped.
+                headers += sum(1 for _ in page.packets())
+                if keep_headers:
+                    serial = page.serial
+                    yield page.encode(sequence)
+                    sequence += 1
+                continue
+
+            samples += sum(opus_packet_samples(packet) for packet in page.packets())
+            if page.granule != -1:
+                # Only the very last page of the joined stream may trim samples off
+                # the end, so the others are set to what was actually decoded.
+                end_granule = offset + page.granule
+                page.granule = offset + samples
+            page.serial = serial
+            page.flags &= ~(OGG_BOS | OGG_EOS)
+            if held is not None:
+                yield held.encode(sequence)
+                sequence += 1
+            held = page
+        offset += samples
+
+    if held is not None:
+        held.flags |= OGG_EOS
+        held.granule = end_granule
+        yield held.encode(sequence)
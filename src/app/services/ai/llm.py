@@ -1,35 +1,277 @@
+import asyncio
+import hashlib
 import json
-from typing import List
+import logging
+import random
+import time
+from typing import AsyncIterator, Hashable, List
 
-import litellm
 from fastapi import HTTPException
-from openai import OpenAIError
 
 from app.utils.ai_logger import logger
+from app.utils.capabilities import lazy_import
 from config import settings
 
+from .resilience import llm_policy, with_fallbacks
+from .scheduler import Priority, llm_scheduler
+
+litellm = lazy_import("litellm")
+openai = lazy_import("openai")
+
+
+class CoalescedCallCancelled(Exception):
+    pass
+
 
 class LLMService:
+    def __init__(self):
+        self.response_pools = {}
+        self.in_flight = {}
+        self.prompt_caching_support = {}
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.coalesced = 0
+        self.saved_tokens = 0
+        self.provider_cached_tokens = 0
 
-    async def chat_completion(self, messages: List[dict[str, str]], step_name: str):
+    async def chat_completion(
+        self,
+        messages: List[dict[str, str]],
+        step_name: str,
+        priority: Priority = Priority.INTERACTIVE,
+    ):
+        key = self.__request_key(messages)
+        while (in_flight := self.in_flight.get(key)) is not None:
+            try:
+                content = await asyncio.shield(in_flight)
+            except CoalescedCallCancelled:
+                # The caller making the request went away; the first waiter to get
+                # here makes it again and the others wait on that instead.
+                continue
+            self.coalesced += 1
+            self.saved_tokens += self.__estimate_tokens(messages, content)
+            return content
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
         try:
-            stream = await litellm.acompletion(
-                model=settings.llm_model_name, messages=messages, stream=True
+            content = await self.__complete(messages, step_name, priority)
+            future.set_result(content)
+        except asyncio.CancelledError:
+            # Only this caller was cancelled, not the ones waiting on its result.
+            future.set_exception(CoalescedCallCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+        return content
+
+    async def cached_chat_completion(
+        self, messages: List[dict[str, str]], step_name: str, cache_key: Hashable
+    ):
+        # Only meant for prompts that don't depend on the conversation: once the pool
+        # holds enough variants, replies are picked from it without calling the provider.
+        pool = self.response_pools.setdefault(cache_key, [])
+        if len(pool) >= settings.llm_variant_pool_size:
+            self.pool_hits += 1
+            content, tokens = random.choice(pool)
+            self.saved_tokens += tokens
+            logger.debug(f"{step_name}: Serving cached response variant")
+            return content
+
+        # Not coalesced: concurrent misses sharing one call would all add the same
+        # reply, leaving a pool of identical "variants" that never refills.
+        self.pool_misses += 1
+        content = await self.__complete(messages, step_name)
+        if len(pool) < settings.llm_variant_pool_size:
+            pool.append((content, self.__estimate_tokens(messages, content)))
+        return content
+
+    async def __complete(
+        self,
+        messages: List[dict[str, str]],
+        step_name: str,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> str:
+        deltas = []
+        async for delta in self.stream_chat_completion(messages, step_name, priority):
+            deltas.append(delta)
+        return "".join(deltas)
+
+    async def stream_chat_completion(
+        self,
+        messages: List[dict[str, str]],
+        step_name: str,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        # Tokenizing the prompt blocks the event loop, so it's only done when there
+        # is a tokens-per-minute budget to charge it against.
+        prompt_tokens = 0
+        if not llm_scheduler.token_bucket.unlimited:
+            prompt_tokens = litellm.token_counter(
+                model=settings.llm_model_name, messages=messages
             )
 
-            chunks = []
-            async for chunk in stream:
-                chunks.append(chunk)
+        async def open_stream(model):
+            # The scheduler slot is held until the stream is drained so the concurrency
+            # cap reflects the requests the provider is actually serving. Retries and
+            # hedges cover the time to the first chunk, before anything is yielded.
+            await llm_scheduler.acquire(priority, tokens=prompt_tokens)
+            stream = None
+            try:
+                stream = await litellm.acompletion(
+                    model=model,
+                    messages=self.__mark_cacheable_prefix(model, messages),
+                    stream=True,
+                    api_base=settings.groq_api_base,
+                )
+                first_chunk = await anext(stream, None)
+            except BaseException:
+                llm_scheduler.release()
+                if stream is not None:
+                    await self.__close_stream(stream)
+                raise
+            return stream, first_chunk
 
-            streamed_response = litellm.stream_chunk_builder(chunks, messages=messages)
-            logger.debug(
-                f"{step_name}: {json.dumps(json.loads(streamed_response.model_dump_json()), indent=4)}"
+        chunks = []
+        usage = None
+        started = time.monotonic()
+        try:
+            stream, first_chunk = await llm_policy.call(
+                open_stream,
+                with_fallbacks(settings.llm_model_name, settings.llm_fallback_models),
+                step_name,
+                discard=self.__discard_stream,
             )
-        except OpenAIError as e:
+            # The step's time budget also covers the rest of the stream, so a provider
+            # that stalls mid-reply can't hold the scheduler slot indefinitely. Only
+            # the waits for the provider are counted, not the time the caller spends
+            # on each delta. Once deltas have been yielded the response has started,
+            # so a timeout here ends the stream early rather than turning into a 504.
+            waited = time.monotonic() - started
+            try:
+                chunk = first_chunk
+                while chunk is not None:
+                    chunks.append(chunk)
+                    usage = getattr(chunk, "usage", None) or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+
+                    remaining = llm_policy.timeout - waited
+                    if remaining <= 0:
+                        raise llm_policy.timeout_error(step_name)
+                    waiting = time.monotonic()
+                    try:
+                        chunk = await asyncio.wait_for(anext(stream, None), remaining)
+                    except asyncio.TimeoutError:
+                        raise llm_policy.timeout_error(step_name)
+                    waited += time.monotonic() - waiting
+            finally:
+                await self.__close_stream(stream)
+                llm_scheduler.release()
+        except openai.OpenAIError as e:
             logger.error(f"({step_name}) Error generating LLM response: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
-        return streamed_response.choices[0].message.content
+        if not chunks:
+            return
+
+        prompt_tokens_details = getattr(usage, "prompt_tokens_details", None)
+        self.provider_cached_tokens += (
+            getattr(prompt_tokens_details, "cached_tokens", None) or 0
+        )
+
+        # The caller is still waiting for the stream to end (to save the turn, or to
+        # send the SSE "done" event), so the full response is rebuilt for the debug
+        # log in a worker thread instead.
+        if logger.isEnabledFor(logging.DEBUG):
+            asyncio.get_running_loop().run_in_executor(
+                None, self.__log_response, step_name, chunks, messages
+            )
+
+    @staticmethod
+    def __log_response(step_name: str, chunks: list, messages: List[dict[str, str]]):
+        try:
+            response = litellm.stream_chunk_builder(chunks, messages=messages)
+            logger.debug(
+                f"{step_name}: "
+                f"{json.dumps(json.loads(response.model_dump_json()), indent=4)}"
+            )
+        except Exception as e:
+            logger.error(f"{step_name}: Unable to log the LLM response: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "variant_pools": len(self.response_pools),
+            "pool_hits": self.pool_hits,
+            "pool_misses": self.pool_misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.in_flight),
+            "saved_tokens": self.saved_tokens,
+            "provider_cached_tokens": self.provider_cached_tokens,
+        }
+
+    def __supports_prompt_caching(self, model: str) -> bool:
+        if model not in self.prompt_caching_support:
+            try:
+                supported = litellm.utils.supports_prompt_caching(model=model)
+            except Exception:
+                supported = False
+            self.prompt_caching_support[model] = supported
+        return self.prompt_caching_support[model]
+
+    def __mark_cacheable_prefix(
+        self, model: str, messages: List[dict[str, str]]
+    ) -> List[dict]:
+        if not messages or messages[0]["role"] != "system":
+            return messages
+        if not self.__supports_prompt_caching(model):
+            return messages
+
+        # The persona system prompt is identical on every turn, so it is the stable
+        # prefix the provider can cache.
+        system_message = {
+            "role": "system",
+            "content": [
+                {
+                    "type": "text",
+                    "text": messages[0]["content"],
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
+        }
+        return [system_message, *messages[1:]]
+
+    @staticmethod
+    async def __close_stream(stream):
+        try:
+            await stream.aclose()
+        except Exception as e:
+            logger.debug(f"Error closing LLM stream: {e}")
+
+    @classmethod
+    async def __discard_stream(cls, opened):
+        # A hedge that lost the race still holds a slot and an open connection.
+        stream, _ = opened
+        llm_scheduler.release()
+        await cls.__close_stream(stream)
+
+    @staticmethod
+    def __request_key(messages: List[dict[str, str]]) -> str:
+        payload = json.dumps([settings.llm_model_name, messages], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def __estimate_tokens(messages: List[dict[str, str]], content: str) -> int:
+        return litellm.token_counter(
+            model=settings.llm_model_name, messages=messages
+        ) + litellm.token_counter(model=settings.llm_model_name, text=content)
 
 
 llm_service = LLMService()
@@ -0,0 +1,217 @@
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException
+
+from app.utils.ai_logger import logger
+from app.utils.capabilities import lazy_import
+from config import settings
+
+T = TypeVar("T")
+
+openai = lazy_import("openai")
+google_exceptions = lazy_import("google.api_core.exceptions")
+
+HEDGE_MIN_SAMPLES = 20
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    # litellm maps provider errors onto openai's status error hierarchy.
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, retryable_errors())
+
+
+class ResiliencePolicy:
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        max_retries: int,
+        hedge: bool,
+        base_delay: float,
+        max_delay: float,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latencies = deque(maxlen=200)
+        self.served_by = Counter()
+        self.targets = Counter()
+        self.retries = 0
+        self.hedges = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    async def call(
+        self,
+        operation: Callable[[str], Awaitable[T]],
+        targets: Sequence[str],
+        step_name: str,
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> T:
+        # `targets` is the primary model (or voice) followed by its fallbacks; each one
+        # gets the full retry budget, all within a single deadline for the step.
+        deadline = time.monotonic() + self.timeout
+        error = None
+
+        for target_index, target in enumerate(targets):
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self.timeout_error(step_name)
+
+                try:
+                    result, hedged = await asyncio.wait_for(
+                        self.__attempt(operation, target, discard), remaining
+                    )
+                except asyncio.TimeoutError:
+                    raise self.timeout_error(step_name)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    error = e
+                    logger.debug(f"{step_name}: {target} failed ({e}), retrying")
+                    if attempt < self.max_retries:
+                        self.retries += 1
+                        delay = self.__backoff(attempt)
+                        await asyncio.sleep(
+                            min(delay, max(0, deadline - time.monotonic()))
+                        )
+                    continue
+
+                if target_index > 0:
+                    path = "fallback"
+                elif hedged:
+                    path = "hedge"
+                elif attempt > 0:
+                    path = "retry"
+                else:
+                    path = "primary"
+                self.served_by[path] += 1
+                self.targets[str(target)] += 1
+                logger.debug(f"{step_name}: served by {path} ({target})")
+                return result
+
+        self.failures += 1
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            "served_by": dict(self.served_by),
+            "targets": dict(self.targets),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "p95_latency": self.__p95_latency(),
+        }
+
+    def timeout_error(self, step_name: str) -> HTTPException:
+        self.timeouts += 1
+        logger.error(f"{step_name}: No response within {self.timeout}s")
+        return HTTPException(
+            status_code=504, detail=f"The {self.name} provider timed out."
+        )
+
+    def __backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from concurrent requests from arriving in lockstep.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def __p95_latency(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return statistics.quantiles(self.latencies, n=20)[-1]
+
+    async def __timed(self, operation: Callable[[str], Awaitable[T]], target: str) -> T:
+        started = time.monotonic()
+        result = await operation(target)
+        self.latencies.append(time.monotonic() - started)
+        return result
+
+    async def __attempt(self, operation, target, discard):
+        hedge_delay = self.__p95_latency() if self.hedge else None
+        if hedge_delay is None:
+            return await self.__timed(operation, target), False
+
+        primary = asyncio.create_task(self.__timed(operation, target))
+        tasks = [primary]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedges += 1
+                tasks.append(asyncio.create_task(self.__timed(operation, target)))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result(), task is not primary
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            if discard is not None:
+                for task, result in zip(tasks, results):
+                    if task is not winner and not isinstance(result, BaseException):
+                        await discard(result)
+
+
+def with_fallbacks(primary, fallbacks) -> list:
+    return list(dict.fromkeys([primary, *fallbacks]))
+
+
+llm_policy = ResiliencePolicy(
+    "LLM",
+    timeout=settings.llm_timeout,
+    max_retries=settings.llm_max_retries,
+    hedge=settings.llm_hedge,
+    base_delay=settings.retry_base_delay,
+    max_delay=settings.retry_max_delay,
+)
+
+stt_policy = ResiliencePolicy(
+    "transcription",
+    timeout=settings.stt_timeout,
+    max_retries=settings.stt_max_retries,
+    hedge=settings.stt_hedge,
+    base_delay=settings.retry_base_delay,
+    max_delay=settings.retry_max_delay,
+)
+
+tts_policy = ResiliencePolicy(
+    "text-to-speech",
+    timeout=settings.tts_timeout,
+    max_retries=settings.tts_max_retries,
+    hedge=settings.tts_hedge,
+    base_delay=settings.retry_base_delay,
+    max_delay=settings.retry_max_delay,
+)
@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Optional
+
+from fastapi import HTTPException
+
+from config import settings
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int, capacity: Optional[int] = None):
+        self.capacity = per_minute if capacity is None else capacity
+        self.rate = per_minute / 60
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0 or self.capacity <= 0
+
+    def wait_time(self, amount: float) -> float:
+        if self.unlimited:
+            return 0
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0, missing / self.rate)
+
+    def consume(self, amount: float):
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+
+class ProviderScheduler:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_queue: int,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.wakeup = None
+        self.active = 0
+        self.started = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 0):
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 0):
+        if not self.waiters and self.__wait_time(tokens) == 0 and self.__has_capacity():
+            self.__start(tokens)
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"The {self.name} provider is busy, please try again shortly.",
+                headers={"Retry-After": str(self.__retry_after())},
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), tokens, future))
+        self.__dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the waiter was cancelled.
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        self.__dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "started": self.started,
+            "rejected": self.rejected,
+        }
+
+    def __has_capacity(self) -> bool:
+        return self.active < self.max_concurrency
+
+    def __wait_time(self, tokens: int) -> float:
+        return max(
+            self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens)
+        )
+
+    def __start(self, tokens: int):
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(tokens)
+        self.active += 1
+        self.started += 1
+
+    def __retry_after(self) -> int:
+        return max(1, math.ceil(self.request_bucket.wait_time(len(self.waiters) + 1)))
+
+    def __dispatch(self):
+        while self.waiters:
+            _, _, tokens, future = self.waiters[0]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+
+            if not self.__has_capacity():
+                return
+
+            wait_time = self.__wait_time(tokens)
+            if wait_time > 0:
+                if self.wakeup is None:
+                    self.wakeup = asyncio.get_running_loop().call_later(
+                        wait_time, self.__wake_up
+                    )
+                return
+
+            heapq.heappop(self.waiters)
+            self.__start(tokens)
+            future.set_result(None)
+
+    def __wake_up(self):
+        self.wakeup = None
+        self.__dispatch()
+
+
+llm_scheduler = ProviderScheduler(
+    "LLM",
+    max_concurrency=settings.llm_max_concurrency,
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    max_queue=settings.llm_max_queue,
+)
+
+transcription_scheduler = ProviderScheduler(
+    "transcription",
+    max_concurrency=settings.stt_max_concurrency,
+    requests_per_minute=settings.stt_requests_per_minute,
+    tokens_per_minute=0,
+    max_queue=settings.stt_max_queue,
+)
+
+tts_scheduler = ProviderScheduler(
+    "text-to-speech",
+    max_concurrency=settings.tts_max_upstream_concurrency,
+    requests_per_minute=settings.tts_requests_per_minute,
+    tokens_per_minute=settings.tts_characters_per_minute,
+    max_queue=settings.tts_max_queue,
+)
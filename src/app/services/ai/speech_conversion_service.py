@@ -1,72 +1,122 @@
 import json
+import logging
 
-import aiofiles
-import google.cloud.texttospeech as tts
-import litellm
 from fastapi import HTTPException
-from google.api_core import exceptions as google_exceptions
-from google.oauth2 import service_account
-from openai import OpenAIError
 
 from app.utils.ai_logger import logger as logger
+from app.utils.capabilities import lazy_import
 from config import settings
 
+from .resilience import stt_policy, tts_policy, with_fallbacks
+from .scheduler import Priority, transcription_scheduler, tts_scheduler
+from .tts_cache import tts_cache
+from .tts_client_pool import tts_client_pool
+
+tts = lazy_import("google.cloud.texttospeech")
+litellm = lazy_import("litellm")
+openai = lazy_import("openai")
+google_exceptions = lazy_import("google.api_core.exceptions")
+
 
 class SpeechConversionService:
 
     async def text_to_speech(
-        self, text: str, output_file: str, voice_name: str, step_name: str
-    ):
-        credentials = service_account.Credentials.from_service_account_info(
-            json.loads(settings.google_service_credentials)
-        )
-
-        client = tts.TextToSpeechAsyncClient(credentials=credentials)
+        self,
+        text: str,
+        voice_name: str,
+        step_name: str,
+        audio_encoding: "tts.AudioEncoding" = None,
+    ) -> bytes:
+        if audio_encoding is None:
+            audio_encoding = tts.AudioEncoding.LINEAR16
+        sample_rate_hertz = settings.tts_sample_rate_hertz
+        audio_settings = {
+            "audio_encoding": int(audio_encoding),
+            "sample_rate_hertz": sample_rate_hertz,
+        }
+        cache_key = tts_cache.make_key(voice_name, audio_settings, text)
+        cached_audio = await tts_cache.get(cache_key)
+        if cached_audio is not None:
+            logger.debug(f"{step_name} Serving synthesized speech from cache")
+            return cached_audio
 
         language_code = "en-US"
 
-        voice_params = tts.VoiceSelectionParams(
-            language_code=language_code, name=voice_name
+        audio_config = tts.AudioConfig(
+            audio_encoding=audio_encoding, sample_rate_hertz=sample_rate_hertz
         )
-        audio_config = tts.AudioConfig(audio_encoding=tts.AudioEncoding.LINEAR16)
         text_input = tts.SynthesisInput(text=text)
 
-        try:
-            response = await client.synthesize_speech(
-                input=text_input,
-                voice=voice_params,
-                audio_config=audio_config,
+        async def synthesize(voice):
+            voice_params = tts.VoiceSelectionParams(
+                language_code=language_code, name=voice
             )
+            client = await tts_client_pool.acquire()
+            async with tts_scheduler.slot(tokens=len(text)):
+                try:
+                    return await client.synthesize_speech(
+                        input=text_input,
+                        voice=voice_params,
+                        audio_config=audio_config,
+                    )
+                except google_exceptions.Unauthenticated:
+                    logger.debug(
+                        f"{step_name} Access token rejected, refreshing and retrying"
+                    )
+                    await tts_client_pool.refresh_token()
+                    return await client.synthesize_speech(
+                        input=text_input,
+                        voice=voice_params,
+                        audio_config=audio_config,
+                    )
+
+        try:
+            response = await tts_policy.call(synthesize, [voice_name], step_name)
         except google_exceptions.Unauthenticated as e:
             logger.error(
                 f"{step_name} Error synthesizing ai's voice: Please verify that your service credentials are correct and have the required permissions."
             )
             raise HTTPException(status_code=500, detail=str(e))
+        except google_exceptions.GoogleAPICallError as e:
+            logger.error(f"{step_name} Error synthesizing ai's voice: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
 
-        async with aiofiles.open(output_file, "wb") as f:
-            logger.debug(
-                f"{step_name} Writing AI response audio content to {output_file}"
-            )
-            await f.write(response.audio_content)
+        if len(text) <= settings.tts_cache_max_text_length:
+            await tts_cache.set(cache_key, response.audio_content)
 
-        return output_file
+        return response.audio_content
 
-    async def speech_to_text(self, input_file: str, step_name: str):
-        async with aiofiles.open(input_file, "rb") as f:
-            content = await f.read()
+    async def speech_to_text(
+        self,
+        audio: bytes,
+        filename: str,
+        step_name: str,
+        priority: Priority = Priority.INTERACTIVE,
+    ):
+        async def transcribe(model):
+            async with transcription_scheduler.slot(priority):
+                return await litellm.atranscription(
+                    model=model,
+                    file=(filename, audio),
+                    temperature=0,
+                    response_format="verbose_json",
+                    api_base=settings.groq_api_base,
+                )
 
         try:
-            transcript = await litellm.atranscription(
-                model=settings.transcript_model_name,
-                file=(input_file, content),
-                temperature=0,
-                response_format="verbose_json",
+            transcript = await stt_policy.call(
+                transcribe,
+                with_fallbacks(
+                    settings.transcript_model_name, settings.transcript_fallback_models
+                ),
+                step_name,
             )
 
             user_message = transcript.text.strip()
-            logger.debug(f"{step_name}: {json.dumps(transcript.json(), indent=4)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"{step_name}: {json.dumps(transcript.json(), indent=4)}")
 
-        except OpenAIError as e:
+        except openai.OpenAIError as e:
             logger.error(f"{step_name} Error transcribing user's voice: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
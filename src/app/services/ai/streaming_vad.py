@@ -0,0 +1,311 @@
+import asyncio
+import io
+import shutil
+import wave
+from typing import Callable, List, Optional
+
+from app.utils.ai_logger import logger
+from config import settings
+
+from .vad_service import vad_service
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+FFMPEG_PATH = shutil.which("ffmpeg")
+
+
+class SpeechActivity:
+    def __init__(self, speech_detected: bool, audio: bytes, extension: str):
+        self.speech_detected = speech_detected
+        self.audio = audio
+        self.extension = extension
+
+    def __repr__(self) -> str:
+        return f"<SpeechActivity: speech={self.speech_detected}, {len(self.audio)} bytes ({self.extension})>"
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+async def encode_opus(pcm: bytes) -> Optional[bytes]:
+    process = None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_PATH,
+            "-loglevel",
+            "error",
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(SAMPLE_RATE),
+            "-i",
+            "pipe:0",
+            "-c:a",
+            "libopus",
+            "-b:a",
+            "24k",
+            "-application",
+            "voip",
+            "-f",
+            "ogg",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        audio, _ = await process.communicate(pcm)
+    except Exception as e:
+        logger.error(f"Error encoding trimmed speech: {e}")
+        return None
+    finally:
+        if process is not None and process.returncode is None:
+            process.kill()
+    if process.returncode != 0:
+        # e.g. an ffmpeg build without libopus; the original upload is used instead.
+        logger.debug("Unable to encode trimmed speech as Opus")
+        return None
+    return audio
+
+
+class SpeechTracker:
+    def __init__(
+        self,
+        window_seconds: float = 1.0,
+        overlap_seconds: float = 0.5,
+        on_classified: Optional[Callable[[], None]] = None,
+    ):
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.overlap = int(overlap_seconds * SAMPLE_RATE)
+        self.on_classified = on_classified
+        self.merge_gap = self.overlap
+        self.pcm = bytearray()
+        self.regions: List[List[int]] = []
+        self.submitted = 0
+        self.classified = 0
+        self.windows: asyncio.Queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self.__classify_windows())
+
+    @property
+    def samples(self) -> int:
+        return len(self.pcm) // SAMPLE_WIDTH
+
+    def feed(self, pcm: bytes):
+        self.pcm.extend(pcm)
+        while self.samples - self.submitted >= self.window:
+            self.__submit(self.submitted + self.window)
+
+    async def finish(self) -> List[List[int]]:
+        if self.samples > self.submitted:
+            self.__submit(self.samples)
+        await self.windows.put(None)
+        await self.worker
+        return self.regions
+
+    def cancel(self):
+        self.worker.cancel()
+
+    def __submit(self, end: int):
+        start = max(0, self.submitted - self.overlap)
+        self.windows.put_nowait((start, end))
+        self.submitted = end
+
+    async def __classify_windows(self):
+        import torch
+
+        while (window := await self.windows.get()) is not None:
+            start, end = window
+            pcm = bytes(self.pcm[start * SAMPLE_WIDTH : end * SAMPLE_WIDTH])
+            wav = torch.frombuffer(bytearray(pcm), dtype=torch.int16).float() / 32768
+            for timestamp in await vad_service.speech_timestamps(wav):
+                self.__add_region(start + timestamp["start"], start + timestamp["end"])
+            self.classified = end
+            if self.on_classified is not None:
+                self.on_classified()
+
+    def __add_region(self, start: int, end: int):
+        if self.regions and start <= self.regions[-1][1] + self.merge_gap:
+            self.regions[-1][0] = min(self.regions[-1][0], start)
+            self.regions[-1][1] = max(self.regions[-1][1], end)
+        else:
+            self.regions.append([start, end])
+
+
+class Endpointer:
+    # Audio is only classified once a whole window has arrived, so silence is seen
+    # up to one window late. A short window (with the overlap as context for the
+    # model) keeps that lag small; the full silence_seconds is still required.
+    WINDOW_SECONDS = 0.25
+    OVERLAP_SECONDS = 0.25
+
+    def __init__(
+        self,
+        silence_seconds: float,
+        max_utterance_seconds: float,
+        max_idle_seconds: float,
+    ):
+        self.silence = int(silence_seconds * SAMPLE_RATE)
+        self.max_utterance = int(max_utterance_seconds * SAMPLE_RATE)
+        self.max_idle = int(max_idle_seconds * SAMPLE_RATE)
+        self.remainder = b""
+        self.utterances: asyncio.Queue = asyncio.Queue()
+        self.tracker = self.__new_tracker()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return vad_service.is_loaded
+
+    @property
+    def speaking(self) -> bool:
+        return bool(self.tracker.regions)
+
+    def feed(self, pcm: bytes):
+        pcm = self.remainder + pcm
+        usable = len(pcm) - len(pcm) % SAMPLE_WIDTH
+        self.remainder = pcm[usable:]
+        self.tracker.feed(pcm[:usable])
+        self.__check()
+
+    async def next_utterance(self) -> bytes:
+        # Endpoints are found as windows get classified, so one can arrive after the
+        # client has stopped sending audio.
+        return await self.utterances.get()
+
+    def __check(self):
+        regions = self.tracker.regions
+        if not regions:
+            # Nobody is talking; only keep enough audio to catch the start of speech.
+            if self.tracker.classified >= self.max_idle:
+                start = self.tracker.classified - self.tracker.overlap
+                self.__reset(bytes(self.tracker.pcm[start * SAMPLE_WIDTH :]))
+            return
+
+        silence = self.tracker.classified - regions[-1][1]
+        length = self.tracker.samples - regions[0][0]
+        if silence < self.silence and length < self.max_utterance:
+            return
+
+        padding = int(settings.vad_trim_padding_seconds * SAMPLE_RATE)
+        start = max(0, regions[0][0] - padding)
+        end = min(self.tracker.samples, regions[-1][1] + padding)
+        utterance = pcm_to_wav(
+            bytes(self.tracker.pcm[start * SAMPLE_WIDTH : end * SAMPLE_WIDTH])
+        )
+        self.__reset(bytes(self.tracker.pcm[end * SAMPLE_WIDTH :]))
+        self.utterances.put_nowait(utterance)
+
+    def close(self):
+        self.tracker.cancel()
+
+    def __new_tracker(self) -> SpeechTracker:
+        return SpeechTracker(
+            window_seconds=self.WINDOW_SECONDS,
+            overlap_seconds=self.OVERLAP_SECONDS,
+            on_classified=self.__check,
+        )
+
+    def __reset(self, pcm: bytes):
+        self.tracker.cancel()
+        self.tracker = self.__new_tracker()
+        self.tracker.feed(pcm)
+
+
+class StreamingVAD:
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.tracker = SpeechTracker()
+        self.failed = False
+        self.reader = asyncio.create_task(self.__read_pcm())
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return vad_service.is_loaded and FFMPEG_PATH is not None
+
+    @classmethod
+    async def start(cls) -> Optional["StreamingVAD"]:
+        if not cls.is_available():
+            return None
+
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_PATH,
+            "-loglevel",
+            "error",
+            "-i",
+            "pipe:0",
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(SAMPLE_RATE),
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        return cls(process)
+
+    async def feed(self, chunk: bytes):
+        if self.failed:
+            return
+        try:
+            self.process.stdin.write(chunk)
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            self.failed = True
+
+    async def finish(
+        self, original_audio: bytes, extension: str
+    ) -> Optional[SpeechActivity]:
+        try:
+            if not self.failed:
+                self.process.stdin.close()
+            await self.reader
+            if await self.process.wait() != 0:
+                self.failed = True
+            regions = await self.tracker.finish()
+        except Exception as e:
+            logger.error(f"Error running streaming voice activity detection: {e}")
+            self.failed = True
+        finally:
+            self.close()
+
+        if self.failed:
+            return None
+
+        if not regions:
+            return SpeechActivity(False, b"", extension)
+
+        padding = int(settings.vad_trim_padding_seconds * SAMPLE_RATE)
+        start = max(0, regions[0][0] - padding)
+        end = min(self.tracker.samples, regions[-1][1] + padding)
+        # Raw PCM is several times the size of a compressed upload, so the speech is
+        # re-encoded before it is compared against what the client sent.
+        trimmed = await encode_opus(
+            bytes(self.tracker.pcm[start * SAMPLE_WIDTH : end * SAMPLE_WIDTH])
+        )
+        if trimmed is not None and len(trimmed) < len(original_audio):
+            return SpeechActivity(True, trimmed, "ogg")
+        return SpeechActivity(True, original_audio, extension)
+
+    def close(self):
+        self.tracker.cancel()
+        self.reader.cancel()
+        if self.process.returncode is None:
+            self.process.kill()
+
+    async def __read_pcm(self):
+        remainder = b""
+        while chunk := await self.process.stdout.read(8192):
+            chunk = remainder + chunk
+            usable = len(chunk) - len(chunk) % SAMPLE_WIDTH
+            self.tracker.feed(chunk[:usable])
+            remainder = chunk[usable:]
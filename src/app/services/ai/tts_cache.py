@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import aiofiles
+
+from app.utils.ai_logger import logger
+from config import settings
+
+# A temp file this old was left behind by a write that never finished.
+STALE_TEMP_SECONDS = 3600
+
+
+class TTSCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.disk_entries = OrderedDict()
+        self.size = 0
+        self.disk_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_path is not None:
+            os.makedirs(self.disk_path, exist_ok=True)
+            self.__scan_disk()
+
+    @staticmethod
+    def make_key(voice_name: str, audio_config: dict, text: str) -> str:
+        normalized_text = " ".join(text.split()).lower()
+        payload = json.dumps(
+            [voice_name, audio_config, normalized_text], sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self.entries.get(key)
+        if audio is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+        if self.disk_path is not None:
+            filename = os.path.join(self.disk_path, key)
+            try:
+                async with aiofiles.open(filename, "rb") as f:
+                    audio = await f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self.disk_hits += 1
+                self.__remember(key, audio)
+                self.__track_disk(key, len(audio))
+                return audio
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, audio: bytes):
+        self.__remember(key, audio)
+
+        if self.disk_path is None or key in self.disk_entries:
+            return
+        if len(audio) > self.disk_max_bytes:
+            return
+
+        # Concurrent misses for the same text each write their own temp file; the
+        # last rename wins, and both hold the same audio.
+        filename = os.path.join(self.disk_path, key)
+        temp_filename = None
+        try:
+            fd, temp_filename = tempfile.mkstemp(dir=self.disk_path, suffix=".tmp")
+            os.close(fd)
+            async with aiofiles.open(temp_filename, "wb") as f:
+                await f.write(audio)
+            os.replace(temp_filename, filename)
+        except OSError as e:
+            logger.error(f"Unable to write TTS cache entry {filename}: {e}")
+            if temp_filename is not None and os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            return
+        self.__track_disk(key, len(audio))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_entries": len(self.disk_entries),
+            "disk_bytes": self.disk_size,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    def __scan_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_path):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".tmp"):
+                if time.time() - stat.st_mtime > STALE_TEMP_SECONDS:
+                    os.remove(entry.path)
+                continue
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.disk_entries[key] = size
+            self.disk_size += size
+        self.__evict_disk()
+
+    def __track_disk(self, key: str, size: int):
+        previous = self.disk_entries.pop(key, None)
+        if previous is not None:
+            self.disk_size -= previous
+        self.disk_entries[key] = size
+        self.disk_size += size
+        self.__evict_disk()
+
+    def __evict_disk(self):
+        # Workers sharing the directory each bound the files they know about, so
+        # the directory can briefly exceed the limit until the next scan.
+        while self.disk_size > self.disk_max_bytes:
+            key, size = self.disk_entries.popitem(last=False)
+            self.disk_size -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(os.path.join(self.disk_path, key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Unable to remove TTS cache entry {key}: {e}")
+
+    def __remember(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+
+        self.entries[key] = audio
+        self.size += len(audio)
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+
+tts_cache = TTSCache(
+    max_bytes=settings.tts_cache_max_bytes,
+    disk_path=(
+        os.path.join(settings.media_path, "tts_cache")
+        if settings.tts_cache_disk
+        else None
+    ),
+    disk_max_bytes=settings.tts_cache_disk_max_bytes,
+)
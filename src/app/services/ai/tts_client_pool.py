@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.utils.ai_logger import logger
+from app.utils.capabilities import lazy_import
+from config import settings
+
+tts = lazy_import("google.cloud.texttospeech")
+auth_exceptions = lazy_import("google.auth.exceptions")
+auth_requests = lazy_import("google.auth.transport.requests")
+service_account = lazy_import("google.oauth2.service_account")
+tts_transports = lazy_import(
+    "google.cloud.texttospeech_v1.services.text_to_speech.transports"
+)
+grpc_aio = lazy_import("grpc.aio")
+
+TTS_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+class TTSClientPool:
+    def __init__(self):
+        self.credentials = None
+        self.clients = []
+        self.next_client = None
+        self.refresh_task = None
+
+    async def start(self):
+        if self.clients:
+            return
+
+        if settings.tts_emulator_host:
+            # Emulators (e.g. the benchmark's fake TTS server) speak plaintext gRPC
+            # and don't check credentials, so there is no token to keep fresh.
+            self.clients = [
+                tts.TextToSpeechAsyncClient(
+                    transport=tts_transports.TextToSpeechGrpcAsyncIOTransport(
+                        channel=grpc_aio.insecure_channel(settings.tts_emulator_host)
+                    )
+                )
+                for _ in range(settings.tts_client_pool_size)
+            ]
+            self.next_client = itertools.cycle(self.clients)
+            return
+
+        try:
+            self.credentials = service_account.Credentials.from_service_account_info(
+                json.loads(settings.google_service_credentials), scopes=TTS_SCOPES
+            )
+        except (ValueError, auth_exceptions.GoogleAuthError) as e:
+            logger.error(f"Unable to load Google service credentials: {e}")
+            return
+
+        self.clients = [
+            tts.TextToSpeechAsyncClient(credentials=self.credentials)
+            for _ in range(settings.tts_client_pool_size)
+        ]
+        self.next_client = itertools.cycle(self.clients)
+        self.refresh_task = asyncio.create_task(self.__keep_token_fresh())
+
+    async def close(self):
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            self.refresh_task = None
+
+        clients, self.clients = self.clients, []
+        for client in clients:
+            await client.transport.close()
+
+    async def acquire(self) -> "tts.TextToSpeechAsyncClient":
+        if not self.clients:
+            await self.start()
+        if not self.clients:
+            raise HTTPException(
+                status_code=500,
+                detail="Google service credentials are missing or malformed.",
+            )
+        return next(self.next_client)
+
+    async def refresh_token(self):
+        await run_in_threadpool(self.credentials.refresh, auth_requests.Request())
+
+    def __seconds_until_refresh(self) -> float:
+        if not self.credentials.valid or self.credentials.expiry is None:
+            return 0
+
+        expiry = self.credentials.expiry.replace(tzinfo=timezone.utc)
+        refresh_at = expiry - timedelta(seconds=settings.tts_token_refresh_margin)
+        return (refresh_at - datetime.now(timezone.utc)).total_seconds()
+
+    async def __keep_token_fresh(self):
+        while True:
+            delay = self.__seconds_until_refresh()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                await self.refresh_token()
+                logger.debug("Refreshed Google TTS access token")
+            except auth_exceptions.GoogleAuthError as e:
+                logger.error(f"Unable to refresh Google TTS access token: {e}")
+                await asyncio.sleep(30)
+
+
+tts_client_pool = TTSClientPool()
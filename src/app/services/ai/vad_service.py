@@ -0,0 +1,128 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from app.utils.ai_logger import logger
+from app.utils.capabilities import is_package_installed
+from config import settings
+
+
+class VADService:
+    def __init__(self):
+        self.model = None
+        self.executor = None
+        self.queue = None
+        self.batch_task = None
+
+    @property
+    def is_loaded(self):
+        return self.model is not None
+
+    async def load(self):
+        if (
+            self.is_loaded
+            or not settings.vad_enabled
+            or not is_package_installed("silero_vad")
+        ):
+            return
+
+        logger.debug("Loading silero vad models...")
+
+        # Silero keeps recurrent state inside the model, so inference is serialized
+        # on a single dedicated worker; torch's intra-op threads provide the parallelism.
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="silero-vad"
+        )
+        loop = asyncio.get_running_loop()
+        self.model = await loop.run_in_executor(self.executor, self.__load_model)
+
+        self.queue = asyncio.Queue()
+        self.batch_task = asyncio.create_task(self.__process_batches())
+
+    async def close(self):
+        if self.batch_task is not None:
+            self.batch_task.cancel()
+            self.batch_task = None
+        if self.queue is not None:
+            # Nothing will process the queue any more; don't leave callers waiting.
+            while not self.queue.empty():
+                _, future = self.queue.get_nowait()
+                if not future.done():
+                    future.set_exception(
+                        RuntimeError("Voice activity detection was shut down")
+                    )
+            self.queue = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.model = None
+
+    async def speech_timestamps(self, audio) -> List[dict]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((audio, future))
+        return await future
+
+    async def is_silent(self, audio) -> bool:
+        return len(await self.speech_timestamps(audio)) == 0
+
+    async def is_silent_batch(self, audios: List) -> List[bool]:
+        return list(await asyncio.gather(*(self.is_silent(audio) for audio in audios)))
+
+    def __load_model(self):
+        import torch
+        from silero_vad import load_silero_vad
+
+        torch.set_num_threads(settings.vad_num_threads)
+        return load_silero_vad()
+
+    def __detect_speech(self, audios: List) -> List:
+        import torch
+        from silero_vad import get_speech_timestamps, read_audio
+
+        # Each item fails on its own, so one corrupt upload doesn't fail the
+        # unrelated requests batched with it.
+        results = []
+        for audio in audios:
+            try:
+                if isinstance(audio, (bytes, bytearray, memoryview)):
+                    audio = io.BytesIO(audio)
+                wav = audio if isinstance(audio, torch.Tensor) else read_audio(audio)
+                results.append(get_speech_timestamps(wav, self.model))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def __process_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < settings.vad_max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            batch = [(audio, future) for audio, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.__detect_speech, [audio for audio, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Error running voice activity detection: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    logger.error(f"Error running voice activity detection: {result}")
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+vad_service = VADService()
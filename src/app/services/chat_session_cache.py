@@ -1,20 +1,164 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from config import settings
+
+from ..utils.ai_logger import logger
 from .chatbot import Chatbot
 from .persona import personas
+from .session_store import (
+    SessionStore,
+    create_session_store,
+    deserialize_state,
+    serialize_state,
+)
+
+
+class SessionEntry:
+    __slots__ = ("chatbot", "last_access", "size")
+
+    def __init__(self, chatbot: Chatbot):
+        self.chatbot = chatbot
+        self.last_access = time.monotonic()
+        self.size = chatbot.estimated_size()
 
 
 class ChatSessionCache:
-    def __init__(self):
-        self.cache = {}
+    def __init__(
+        self, max_entries: int, max_bytes: int, idle_ttl: float, store: SessionStore
+    ):
+        self.cache = OrderedDict()
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = {"idle": 0, "entries": 0, "bytes": 0}
+        self.sweeper = None
 
     def add_session(self, chatbot: Chatbot, user_id: str):
-        self.cache[f"{user_id}:{chatbot.persona.name}"] = chatbot
+        key = (user_id, chatbot.persona.name)
+        previous = self.cache.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.size
+
+        chatbot.on_state_change = self.save_session
+        entry = SessionEntry(chatbot)
+        self.cache[key] = entry
+        self.total_bytes += entry.size
+        self.__evict_over_capacity()
+        return entry
+
+    async def get_or_create_session(self, user_id: str, persona: str):
+        key = (user_id, persona)
+        entry = self.cache.get(key)
+
+        if entry is None or self.store.shared:
+            data = await self.store.load(self.__store_key(user_id, persona))
+            entry = self.cache.get(key)
+
+            if entry is None:
+                chatbot = Chatbot(persona=personas[persona], user_id=user_id)
+                if data is None:
+                    self.misses += 1
+                else:
+                    self.store_hits += 1
+                    chatbot.restore_state(deserialize_state(data))
+                return self.add_session(chatbot, user_id).chatbot
+
+            if data is not None:
+                entry.chatbot.restore_state(deserialize_state(data))
+
+        self.hits += 1
+        self.cache.move_to_end(key)
+        entry.last_access = time.monotonic()
+        self.__resize(entry)
+        self.__evict_over_capacity()
+        return entry.chatbot
+
+    async def save_session(self, chatbot: Chatbot):
+        if not self.store.shared:
+            return
+        await self.store.save(
+            self.__store_key(chatbot.user_id, chatbot.persona.name),
+            serialize_state(chatbot.to_state()),
+        )
+
+    def sweep(self):
+        expires_before = time.monotonic() - self.idle_ttl
+        while self.cache:
+            key, entry = next(iter(self.cache.items()))
+            if entry.last_access > expires_before:
+                break
+            self.__evict(key, "idle")
+
+        for entry in self.cache.values():
+            self.__resize(entry)
+        self.__evict_over_capacity()
+
+    def start_sweeper(self):
+        if self.sweeper is None:
+            self.sweeper = asyncio.create_task(self.__sweep_periodically())
+
+    async def close(self):
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            self.sweeper = None
+        await self.store.close()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.cache),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "store": type(self.store).__name__,
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "evictions": dict(self.evictions),
+        }
+
+    @staticmethod
+    def __store_key(user_id: str, persona: str) -> str:
+        return f"chatbot:{user_id}:{persona}"
+
+    def __resize(self, entry: SessionEntry):
+        size = entry.chatbot.estimated_size()
+        self.total_bytes += size - entry.size
+        entry.size = size
+
+    def __evict(self, key, reason: str):
+        entry = self.cache.pop(key)
+        self.total_bytes -= entry.size
+        self.evictions[reason] += 1
+
+    def __evict_over_capacity(self):
+        # The most recently used session is never evicted, even if it alone exceeds max_bytes.
+        while len(self.cache) > 1:
+            if len(self.cache) > self.max_entries:
+                reason = "entries"
+            elif self.total_bytes > self.max_bytes:
+                reason = "bytes"
+            else:
+                break
+            self.__evict(next(iter(self.cache)), reason)
 
-    def get_or_create_session(self, user_id: str, persona: str):
-        if f"{user_id}:{persona}" in self.cache.keys():
-            return self.cache[f"{user_id}:{persona}"]
-        chatbot = Chatbot(persona=personas[persona], user_id=user_id)
-        self.add_session(chatbot, user_id)
-        return chatbot
+    async def __sweep_periodically(self):
+        while True:
+            await asyncio.sleep(settings.session_sweep_interval)
+            self.sweep()
+            await self.store.sweep()
+            logger.debug(f"Chat session cache: {self.stats()}")
 
 
-CHATBOT_CACHE = ChatSessionCache()
+CHATBOT_CACHE = ChatSessionCache(
+    max_entries=settings.session_max_entries,
+    max_bytes=settings.session_max_bytes,
+    idle_ttl=settings.session_idle_ttl,
+    store=create_session_store(),
+)
@@ -1,16 +1,22 @@
 import logging
-import os
-
-from fastapi.concurrency import run_in_threadpool
+import time
 
 from config import settings
 
 from ..utils.ai_logger import logger as ai_logger
-from ..utils.check_package import is_package_installed
+from ..utils.metrics import observe_stage, stage_span
+from .ai.audio_formats import AUDIO_FORMATS, AudioFormat
 from .ai.llm import llm_service
+from .ai.scheduler import Priority
 from .ai.speech_conversion_service import speech_service
+from .ai.vad_service import vad_service
+from .conversation import ConversationBuffer, count_tokens
+from .knowledge_base import knowledge_base
 from .persona import Persona
 from .prompts import prompt_manager
+from .speculation import SpeculativeReply, SpeculativeTranscriber
+from .speech_pipeline import split_sentences, synthesize_in_order
+from .summary_queue import summary_queue
 
 logger = ai_logger
 logger.setLevel(logging.DEBUG if settings.debug_mode else logging.INFO)
@@ -18,63 +24,143 @@ logger.setLevel(logging.DEBUG if settings.debug_mode else logging.INFO)
 
 class Chatbot:
     def __init__(self, persona: Persona, user_id: str):
-        self.memory = []
+        self.memory = ConversationBuffer(max_messages=settings.memory_max_messages)
         self.summary_threshold = 10
         self.current_summary = ""
         self.persona = persona
         self.user_id = user_id
-        self.system_prompt = prompt_manager.get_prompt(
-            "system_prompt", {"persona": persona.name}
-        )
+        self.system_prompt = self.__default_system_prompt()
+        self.on_state_change = None
 
     def __repr__(self) -> str:
         return f"<Chatbot ({self.persona.name}): {self.user_id}>"
 
-    def __is_silent_audio(self, filename):
-        ai_logger.debug(
-            f"User({self.user_id}): Checking user's audio for silence using Silero VAD"
+    def estimated_size(self) -> int:
+        return (
+            len(self.system_prompt)
+            + len(self.current_summary)
+            + self.memory.estimated_size()
         )
 
-        from silero_vad import get_speech_timestamps, load_silero_vad, read_audio
-
-        model = load_silero_vad()
-        wav = read_audio(filename)
-        speech_timestamps = get_speech_timestamps(wav, model)
-
-        if len(speech_timestamps) > 0:
-            return False
-
-        ai_logger.debug(
-            f"User({self.user_id}): No speech detected in user's audio, skipping transcription step"
+    def __default_system_prompt(self):
+        return prompt_manager.get_prompt(
+            "system_prompt", {"persona": self.persona.name}, cache=True
         )
-        return True
+
+    def to_state(self) -> dict:
+        state = {
+            "u": self.user_id,
+            "p": self.persona.name,
+            "m": self.memory.to_state(),
+            "s": self.current_summary,
+        }
+        if self.system_prompt != self.__default_system_prompt():
+            state["sp"] = self.system_prompt
+        return state
+
+    def restore_state(self, state: dict):
+        self.memory.restore_state(state["m"])
+        self.current_summary = state["s"]
+        self.system_prompt = state.get("sp") or self.__default_system_prompt()
+
+    async def save_state(self):
+        if self.on_state_change is not None:
+            await self.on_state_change(self)
 
     def set_system_prompt(self, prompt: str):
         self.system_prompt = prompt
 
     def reset_memory(self):
-        self.memory = []
-
-    def get_prompt(self):
-        return (
-            f"\n{self.current_summary}".join(self.memory[-(self.summary_threshold) :])
-            + f"\nAI: "
+        self.memory.clear()
+
+    def get_messages(self, knowledge: list = ()):
+        messages = [{"role": "system", "content": self.system_prompt}]
+        token_budget = min(
+            settings.prompt_token_budget,
+            settings.llm_model_name.context_window
+            - settings.llm_completion_token_reserve
+            - count_tokens(self.system_prompt),
         )
 
-    async def __generate_ai_response(self):
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": self.get_prompt()},
-        ]
-        ai_message = await llm_service.chat_completion(
-            messages, step_name=f"User({self.user_id}): LLM Response Step"
+        if self.current_summary:
+            summary = f"Summary of the earlier conversation:\n{self.current_summary}"
+            messages.append({"role": "system", "content": summary})
+            token_budget -= count_tokens(summary)
+
+        # Retrieved chunks change every turn, so they go after the stable system
+        # prompt rather than into it, leaving the cacheable prefix intact.
+        if knowledge:
+            context = prompt_manager.get_prompt(
+                "knowledge_prompt", {"chunks": knowledge}
+            )
+            messages.append({"role": "system", "content": context})
+            token_budget -= count_tokens(context)
+
+        messages.extend(
+            message.to_message()
+            for message in self.memory.recent_within(token_budget)
+            if message.content
+        )
+        return messages
+
+    def __memory_tail(self):
+        return self.memory.messages[-1] if len(self.memory) else None
+
+    async def speculate(self, message: str) -> SpeculativeReply:
+        # Runs the turn as if the message had been received, without touching the
+        # conversation, so the reply can be thrown away if the guess was wrong.
+        with stage_span("retrieval", self.persona.name, "hashing"):
+            knowledge = await knowledge_base.search(message)
+        messages = self.get_messages(knowledge)
+        messages.append({"role": "user", "content": message})
+        return SpeculativeReply(
+            message,
+            messages,
+            self.__memory_tail(),
+            step_name=f"User({self.user_id}): LLM Response Step (Speculative)",
         )
+
+    async def __generate_ai_response(
+        self, message: str, speculation: SpeculativeReply = None
+    ):
+        model = settings.llm_model_name.value
+        deltas = []
+        started = time.perf_counter()
+        if speculation is not None:
+            replies = speculation.replay()
+        else:
+            with stage_span("retrieval", self.persona.name, "hashing"):
+                knowledge = await knowledge_base.search(message)
+            replies = llm_service.stream_chat_completion(
+                self.get_messages(knowledge),
+                step_name=f"User({self.user_id}): LLM Response Step",
+            )
+
+        async for delta in replies:
+            if not deltas:
+                elapsed = time.perf_counter() - started
+                observe_stage("llm_ttft", self.persona.name, model, elapsed)
+            deltas.append(delta)
+            yield delta
+        elapsed = time.perf_counter() - started
+        observe_stage("llm_total", self.persona.name, model, elapsed)
+
+        ai_message = "".join(deltas)
         logger.debug(f"User({self.user_id}): AI({self.persona.name}) - {ai_message}")
-        return ai_message
 
     async def summarize(self):
+        # Fold the messages that are about to leave the prompt window into the
+        # existing summary instead of re-summarizing the whole conversation.
+        folded = self.memory.oldest(len(self.memory) - self.summary_threshold // 2)
+        if not folded:
+            return
+
         prompt = prompt_manager.get_prompt(
-            "summarization_prompt", {"context": "\n".join(self.memory)}
+            "summarization_prompt",
+            {
+                "summary": self.current_summary,
+                "context": "\n".join(message.format() for message in folded),
+            },
         )
         messages = [
             {"role": "system", "content": prompt},
@@ -84,78 +170,139 @@ class Chatbot:
             f"Conversation exceeded summary threshold, summarizing previous messages"
         )
 
-        self.current_summary = await llm_service.chat_completion(
+        summary = await llm_service.chat_completion(
             messages,
             step_name=f"User({self.user_id}): LLM Response Step (Summarization)",
+            priority=Priority.BACKGROUND,
         )
 
-        self.memory = self.memory[-(self.summary_threshold) :]
+        # New turns may have been appended meanwhile; only drop the folded prefix,
+        # and only if nothing else has rewritten the conversation in the meantime.
+        if not self.memory.drop_oldest(folded):
+            logger.debug(
+                f"User({self.user_id}): Conversation changed, discarding summary"
+            )
+            return
 
-    async def __check_for_silence(self, input_file):
-        response = await run_in_threadpool(self.__is_silent_audio, input_file)
-        return response
+        self.current_summary = summary
+        await self.save_state()
 
     async def __silent_speech_response(self):
         messages = [
             {
                 "role": "system",
-                "content": prompt_manager.get_prompt("silent_prompt"),
+                "content": prompt_manager.get_prompt("silent_prompt", cache=True),
             }
         ]
 
-        ai_message = await llm_service.chat_completion(
+        ai_message = await llm_service.cached_chat_completion(
             messages,
             step_name=f"User({self.user_id}): LLM Response Step (Silent Speech)",
+            cache_key=("silent_prompt", self.persona.name),
         )
-        self.memory.append(f"AI: {ai_message}")
         logger.debug(f"User({self.user_id}): AI({self.persona.name}) - {ai_message}")
         return ai_message
 
     async def respond(self, message):
-        self.memory.append(f"HUMAN: {message}")
+        deltas = []
+        async for delta in self.stream_respond(message):
+            deltas.append(delta)
+
+        return "".join(deltas)
+
+    async def stream_respond(self, message, speculation: SpeculativeReply = None):
+        if speculation is not None and not speculation.claim(self.__memory_tail()):
+            speculation = None
+
+        self.memory.append("user", message)
 
         if len(self.memory) > self.summary_threshold:
-            await self.summarize()
+            summary_queue.submit((self.user_id, self.persona.name), self.summarize)
 
         if message == "":
             ai_response = await self.__silent_speech_response()
+            yield ai_response
         else:
-            ai_response = await self.__generate_ai_response()
-
-        self.memory.append(f"AI: {ai_response}")
-
-        return ai_response
-
-    async def voice_respond(self, input_filename: str):
-        user_message = await self.__speech_to_text(input_filename)
-
-        if os.path.exists(input_filename):
-            os.remove(input_filename)
-
-        ai_response = await self.respond(user_message)
-        output_filename = await self.__text_to_speech(ai_response)
-        return output_filename
-
-    async def __speech_to_text(self, input_filename: str):
-
-        if is_package_installed("silero_vad") == True:
-            if await self.__check_for_silence(input_filename):
-                return ""
+            deltas = []
+            async for delta in self.__generate_ai_response(message, speculation):
+                deltas.append(delta)
+                yield delta
+            ai_response = "".join(deltas)
+
+        self.memory.append("assistant", ai_response)
+        await self.save_state()
+
+    async def voice_respond(
+        self,
+        audio: bytes,
+        filename: str,
+        speech_detected: bool = None,
+        audio_format: AudioFormat = None,
+        speculation: SpeculativeTranscriber = None,
+    ):
+        user_message = None
+        if speech_detected is None:
+            # Checked before a speculative transcript is reused, so silence still
+            # takes the silent-speech path instead of whatever Whisper heard in it.
+            speech_detected = not await self.__is_silent(audio)
+
+        if speech_detected is False:
+            logger.debug(
+                f"User({self.user_id}): No speech detected, skipping transcription step"
+            )
+            user_message = ""
+        elif speculation is not None:
+            user_message = await speculation.final_transcript()
+            if user_message is not None:
+                logger.debug(
+                    f"User({self.user_id}): Speculative transcript covers the whole upload, skipping transcription step"
+                )
+
+        if user_message is None:
+            user_message = await self.__speech_to_text(audio, filename)
+
+        reply = speculation.adopt(user_message) if speculation is not None else None
+        audio_format = audio_format or AUDIO_FORMATS[settings.tts_default_audio_format]
+        return self.__speak(self.stream_respond(user_message, reply), audio_format)
+
+    async def __speak(self, deltas, audio_format: AudioFormat):
+        async def text_to_speech(message: str):
+            return await self.__text_to_speech(message, audio_format)
+
+        segments = split_sentences(deltas)
+        async for audio_content in synthesize_in_order(
+            segments, text_to_speech, settings.tts_max_concurrency
+        ):
+            yield audio_content
+
+    async def __is_silent(self, audio: bytes) -> bool:
+        if not vad_service.is_loaded:
+            return False
 
-        user_message = await speech_service.speech_to_text(
-            input_filename, step_name=f"User({self.user_id}): Transcription Service"
+        logger.debug(
+            f"User({self.user_id}): Checking user's audio for silence using Silero VAD"
         )
+        with stage_span("vad", self.persona.name, "silero"):
+            return await vad_service.is_silent(audio)
+
+    async def __speech_to_text(self, audio: bytes, filename: str):
+        with stage_span("stt", self.persona.name, settings.transcript_model_name.value):
+            user_message = await speech_service.speech_to_text(
+                audio,
+                filename,
+                step_name=f"User({self.user_id}): Transcription Service",
+            )
 
         logger.debug(f"User({self.user_id}): {user_message}")
 
         return user_message
 
-    async def __text_to_speech(self, message: str):
-        filename = os.path.join(settings.media_path, f"output-{self.user_id}.wav")
-
+    async def __text_to_speech(self, message: str, audio_format: AudioFormat):
         logger.debug(f"User({self.user_id}): Speech Synthesis Step running...")
-        await speech_service.text_to_speech(
-            message, filename, self.persona.voice, f"User({self.user_id}):"
-        )
-
-        return filename
+        with stage_span("tts", self.persona.name, self.persona.voice):
+            return await speech_service.text_to_speech(
+                message,
+                self.persona.voice,
+                f"User({self.user_id}):",
+                audio_encoding=audio_format.encoding,
+            )
@@ -0,0 +1,90 @@
+from collections import deque
+from functools import lru_cache
+from typing import List
+
+from config import settings
+
+from ..utils.capabilities import lazy_import
+
+litellm = lazy_import("litellm")
+
+ROLE_LABELS = {"user": "HUMAN", "assistant": "AI"}
+
+
+@lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    return litellm.token_counter(model=settings.llm_model_name, text=text)
+
+
+class Message:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str, tokens: int = None):
+        self.role = role
+        self.content = content
+        self.tokens = tokens if tokens is not None else count_tokens(content)
+
+    def __repr__(self) -> str:
+        return f"<Message ({self.role}): {self.tokens} tokens>"
+
+    def format(self) -> str:
+        return f"{ROLE_LABELS[self.role]}: {self.content}"
+
+    def to_message(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class ConversationBuffer:
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def append(self, role: str, content: str) -> Message:
+        message = Message(role, content)
+        self.messages.append(message)
+        return message
+
+    def clear(self):
+        self.messages.clear()
+
+    def oldest(self, count: int) -> List[Message]:
+        return [self.messages[i] for i in range(max(0, min(count, len(self.messages))))]
+
+    def drop_oldest(self, messages: List[Message]) -> bool:
+        if len(messages) > len(self.messages) or any(
+            current is not message for current, message in zip(self.messages, messages)
+        ):
+            return False
+
+        for _ in messages:
+            self.messages.popleft()
+        return True
+
+    def recent_within(self, token_budget: int) -> List[Message]:
+        recent = []
+        for message in reversed(self.messages):
+            if message.tokens > token_budget:
+                break
+            token_budget -= message.tokens
+            recent.append(message)
+        recent.reverse()
+        return recent
+
+    def estimated_size(self) -> int:
+        return sum(len(message.content) for message in self.messages)
+
+    def to_state(self) -> list:
+        return [
+            [message.role, message.content, message.tokens] for message in self.messages
+        ]
+
+    def restore_state(self, state: list):
+        self.messages.clear()
+        self.messages.extend(
+            Message(role, content, tokens) for role, content, tokens in state
+        )
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from app.utils.ai_logger import logger
+from config import settings
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+STOP_WORDS = frozenset("""
+    a an and are as at be but by can could do does for from has have how i if in
+    is it its me my of on or our so that the their there this to was we what
+    when where which who why will with would you your
+    """.split())
+SUFFIXES = ("ities", "ity", "ing", "ies", "ied", "es", "ed", "ly", "s")
+PREFIX_LENGTH = 5
+DOCUMENT_EXTENSIONS = (".md", ".txt")
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.json"
+# Bump when embed() changes, so indexes built with the old features get rebuilt.
+INDEX_VERSION = 2
+
+
+@lru_cache(maxsize=65536)
+def hash_feature(feature: str, dimensions: int) -> tuple[int, float]:
+    digest = int.from_bytes(
+        hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little"
+    )
+    return digest % dimensions, 1.0 if digest >> 63 else -1.0
+
+
+def stem(word: str) -> str:
+    # Crude suffix stripping, so "share", "shared" and "sharing", or "file" and
+    # "files", end up as the same feature. Stems only need to be consistent, not words.
+    if word.endswith("ss"):
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def embed(text: str, dimensions: int) -> np.ndarray:
+    # Signed feature hashing of word stems, word prefixes (so "integrated" matches
+    # "integrations") and stem pairs: there is no model to download or serve, and
+    # the same text maps to the same vector at build and query time.
+    words = [
+        stem(word)
+        for word in WORD_PATTERN.findall(text.lower())
+        if word not in STOP_WORDS
+    ]
+    features = Counter(words)
+    features.update(
+        f"{word[:PREFIX_LENGTH]}~" for word in words if len(word) > PREFIX_LENGTH
+    )
+    features.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, count in features.items():
+        index, sign = hash_feature(feature, dimensions)
+        vector[index] += sign * (1 + math.log(count))
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def chunk_document(text: str, source: str, max_words: int) -> List[dict]:
+    chunks = []
+    title = ""
+    overview = False
+    paragraphs = []
+    words = 0
+
+    def flush():
+        nonlocal words
+        if paragraphs:
+            chunks.append(
+                {
+                    "source": source,
+                    "title": title,
+                    "text": "\n\n".join(paragraphs),
+                    "overview": overview,
+                }
+            )
+        paragraphs.clear()
+        words = 0
+
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if paragraph.startswith("#"):
+            # Chunks never span a heading, and carry it so they make sense on their own.
+            flush()
+            heading, _, paragraph = paragraph.partition("\n")
+            title = heading.lstrip("#").strip()
+            # Text under a top-level heading introduces the document as a whole.
+            overview = not heading.startswith("##")
+            paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        paragraph_words = paragraph.split()
+        for start in range(0, len(paragraph_words), max_words):
+            piece = paragraph_words[start : start + max_words]
+            if words + len(piece) > max_words:
+                flush()
+            paragraphs.append(
+                paragraph if len(paragraph_words) <= max_words else " ".join(piece)
+            )
+            words += len(piece)
+
+    flush()
+    return chunks
+
+
+def build_index(
+    docs_path: str, index_path: str, dimensions: int, max_words: int
+) -> int:
+    chunks = []
+    for root, _, filenames in os.walk(docs_path):
+        for filename in sorted(filenames):
+            if not filename.endswith(DOCUMENT_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            source = os.path.relpath(path, docs_path).replace(os.sep, "/")
+            with open(path, encoding="utf-8") as f:
+                chunks.extend(chunk_document(f.read(), source, max_words))
+
+    # Vectors are written straight into the memory-mapped file, so building a large
+    # corpus never needs the whole matrix in memory.
+    os.makedirs(index_path, exist_ok=True)
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(index_path, EMBEDDINGS_FILE),
+        mode="w+",
+        dtype=np.float32,
+        shape=(len(chunks), dimensions),
+    )
+    for row, chunk in enumerate(chunks):
+        embeddings[row] = embed(f"{chunk['title']}\n{chunk['text']}", dimensions)
+    embeddings.flush()
+    del embeddings
+
+    with open(os.path.join(index_path, CHUNKS_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": INDEX_VERSION, "dimensions": dimensions, "chunks": chunks}, f
+        )
+    return len(chunks)
+
+
+class KnowledgeBase:
+    def __init__(
+        self,
+        index_path: str,
+        docs_path: Optional[str],
+        top_k: int,
+        min_score: float,
+        query_cache_size: int,
+        product_terms: List[str] = (),
+    ):
+        self.index_path = index_path
+        self.docs_path = docs_path
+        self.top_k = top_k
+        self.min_score = min_score
+        self.product_terms = frozenset(term.lower() for term in product_terms)
+        self.query_cache_size = query_cache_size
+        self.query_cache = OrderedDict()
+        self.embeddings = None
+        self.chunks = []
+        self.dimensions = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"<KnowledgeBase: {len(self.chunks)} chunks>"
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.embeddings is not None
+
+    def load(self):
+        chunks_file = os.path.join(self.index_path, CHUNKS_FILE)
+        if not self.__is_current(chunks_file):
+            if not self.docs_path or not os.path.isdir(self.docs_path):
+                logger.debug(
+                    "No current knowledge index or documents found, retrieval disabled"
+                )
+                return
+            # Large corpora should be indexed ahead of time; this keeps a fresh
+            # checkout working with the bundled docs.
+            logger.info(f"Building knowledge index from {self.docs_path}...")
+            build_index(
+                self.docs_path,
+                self.index_path,
+                settings.knowledge_embedding_dimensions,
+                settings.knowledge_chunk_words,
+            )
+
+        with open(chunks_file, encoding="utf-8") as f:
+            index = json.load(f)
+        self.dimensions = index["dimensions"]
+        self.chunks = index["chunks"]
+        self.embeddings = np.load(
+            os.path.join(self.index_path, EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        self.query_cache.clear()
+        logger.debug(
+            f"Loaded {len(self.chunks)} knowledge chunks from {self.index_path}"
+        )
+
+    @staticmethod
+    def __is_current(chunks_file: str) -> bool:
+        if not os.path.exists(chunks_file):
+            return False
+        with open(chunks_file, encoding="utf-8") as f:
+            return json.load(f).get("version") == INDEX_VERSION
+
+    def embed_query(self, query: str) -> np.ndarray:
+        key = " ".join(query.lower().split())
+        vector = self.query_cache.get(key)
+        if vector is not None:
+            self.query_cache.move_to_end(key)
+            self.hits += 1
+            return vector
+
+        self.misses += 1
+        vector = embed(key, self.dimensions)
+        self.query_cache[key] = vector
+        if len(self.query_cache) > self.query_cache_size:
+            self.query_cache.popitem(last=False)
+        return vector
+
+    async def search(self, query: str) -> List[dict]:
+        if not self.is_loaded or not self.chunks or not query.strip():
+            return []
+
+        vector = self.embed_query(query)
+        chunks = []
+        if vector.any():
+            loop = asyncio.get_running_loop()
+            chunks = await loop.run_in_executor(None, self.__top_k, vector)
+
+        # "tell me about the product" shares no words with any section, but the
+        # overview is still the right thing to answer it with.
+        if not chunks and self.product_terms.intersection(
+            WORD_PATTERN.findall(query.lower())
+        ):
+            chunks = [chunk for chunk in self.chunks if chunk.get("overview")][
+                : self.top_k
+            ]
+        return chunks
+
+    def __top_k(self, vector: np.ndarray) -> List[dict]:
+        scores = self.embeddings @ vector
+        k = min(self.top_k, len(scores))
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return [self.chunks[index] for index in best if scores[index] >= self.min_score]
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.chunks),
+            "dimensions": self.dimensions,
+            "query_cache_entries": len(self.query_cache),
+            "query_cache_hits": self.hits,
+            "query_cache_misses": self.misses,
+        }
+
+
+knowledge_base = KnowledgeBase(
+    index_path=settings.knowledge_index_path
+    or os.path.join(settings.media_path, "knowledge_index"),
+    docs_path=settings.knowledge_docs_path,
+    top_k=settings.knowledge_top_k,
+    min_score=settings.knowledge_min_score,
+    query_cache_size=settings.knowledge_query_cache_size,
+    product_terms=settings.knowledge_product_terms,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the product knowledge index.")
+    parser.add_argument("--docs", default=settings.knowledge_docs_path)
+    parser.add_argument("--index", default=knowledge_base.index_path)
+    parser.add_argument(
+        "--dimensions", type=int, default=settings.knowledge_embedding_dimensions
+    )
+    parser.add_argument(
+        "--chunk-words", type=int, default=settings.knowledge_chunk_words
+    )
+    args = parser.parse_args()
+
+    count = build_index(args.docs, args.index, args.dimensions, args.chunk_words)
+    print(f"Indexed {count} chunks from {args.docs} into {args.index}")
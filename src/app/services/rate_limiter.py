@@ -0,0 +1,170 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from config import settings
+
+from ..utils.ai_logger import logger
+from .ai.scheduler import TokenBucket
+
+# Refills and spends a token bucket in one atomic step, so workers sharing the
+# store can't both spend the last token.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RateLimiter(ABC):
+    def __init__(self, requests_per_minute: int, burst: int):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.limited = 0
+
+    @property
+    def unlimited(self) -> bool:
+        return self.requests_per_minute <= 0 or self.burst <= 0
+
+    async def hit(self, key: str) -> float:
+        # Returns 0 when the request may proceed, otherwise the seconds until it could.
+        if self.unlimited:
+            return 0
+
+        retry_after = await self.take(key)
+        if retry_after > 0:
+            self.limited += 1
+        return retry_after
+
+    @abstractmethod
+    async def take(self, key: str) -> float:
+        pass
+
+    def stats(self) -> dict:
+        return {"limited": self.limited}
+
+    async def close(self):
+        pass
+
+
+class InProcessRateLimiter(RateLimiter):
+    def __init__(self, requests_per_minute: int, burst: int, max_entries: int):
+        super().__init__(requests_per_minute, burst)
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+
+    async def take(self, key: str) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(
+                self.requests_per_minute, self.burst
+            )
+            # Evicting the least recently used bucket only forgets a client that has
+            # been quiet the longest, which at worst grants it a fresh burst.
+            while len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        self.buckets.move_to_end(key)
+
+        retry_after = bucket.wait_time(1)
+        if retry_after == 0:
+            bucket.consume(1)
+        return retry_after
+
+    def stats(self) -> dict:
+        return {**super().stats(), "tracked": len(self.buckets)}
+
+
+class RedisRateLimiter(RateLimiter):
+    def __init__(self, url: str, requests_per_minute: int, burst: int):
+        import redis.asyncio as redis
+
+        super().__init__(requests_per_minute, burst)
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.errors = 0
+
+    async def take(self, key: str) -> float:
+        try:
+            retry_after = await self.script(
+                keys=[f"rate_limit:{key}"],
+                args=[self.burst, self.requests_per_minute / 60, time.time(), 1],
+            )
+        except Exception as e:
+            # Fail open: an unavailable store shouldn't take the whole service down.
+            self.errors += 1
+            logger.error(f"Unable to check rate limit for {key}: {e}")
+            return 0
+        return float(retry_after)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "errors": self.errors}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class InFlightLimiter:
+    # Turns run against this worker's cached Chatbot, so overlapping requests are
+    # only tracked per process.
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = {}
+        self.rejected = 0
+
+    def try_acquire(self, key: str) -> bool:
+        if self.max_in_flight <= 0:
+            return True
+
+        count = self.in_flight.get(key, 0)
+        if count >= self.max_in_flight:
+            self.rejected += 1
+            return False
+        self.in_flight[key] = count + 1
+        return True
+
+    def release(self, key: str):
+        if self.max_in_flight <= 0:
+            return
+
+        count = self.in_flight.pop(key, 0) - 1
+        if count > 0:
+            self.in_flight[key] = count
+
+    def stats(self) -> dict:
+        return {
+            "active": sum(self.in_flight.values()),
+            "rejected": self.rejected,
+        }
+
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.rate_limit_store == "redis":
+        return RedisRateLimiter(
+            settings.rate_limit_store_url or settings.session_store_url,
+            requests_per_minute=settings.rate_limit_requests_per_minute,
+            burst=settings.rate_limit_burst,
+        )
+
+    return InProcessRateLimiter(
+        requests_per_minute=settings.rate_limit_requests_per_minute,
+        burst=settings.rate_limit_burst,
+        max_entries=settings.session_max_entries,
+    )
+
+
+rate_limiter = create_rate_limiter()
+in_flight_limiter = InFlightLimiter(settings.rate_limit_max_in_flight)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import zlib
+from typing import Optional
+
+from config import settings
+
+from ..utils.ai_logger import logger
+
+
+def serialize_state(state: dict) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode(), 1)
+
+
+def deserialize_state(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+class SessionStore:
+    # Shared stores may be written by other workers, so cached sessions must be reloaded.
+    # The base store keeps nothing: in a single process the session cache already
+    # holds every live conversation, and keeping snapshots as well would bypass
+    # its byte limit.
+    shared = False
+
+    async def load(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def save(self, key: str, data: bytes):
+        pass
+
+    async def sweep(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class RedisSessionStore(SessionStore):
+    shared = True
+
+    def __init__(self, url: str, ttl: int, flush_interval: float = 0.005):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.flusher = None
+
+    async def load(self, key: str) -> Optional[bytes]:
+        if key in self.pending:
+            return self.pending[key]
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.expire(key, self.ttl)
+            data, _ = await pipe.execute()
+        return data
+
+    async def save(self, key: str, data: bytes):
+        # Writes are coalesced per key and flushed in a single pipeline round trip.
+        self.pending[key] = data
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.create_task(self.__flush_soon())
+
+    async def close(self):
+        if self.flusher is not None:
+            await self.flusher
+        await self.flush()
+        await self.client.aclose()
+
+    async def flush(self):
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, data in pending.items():
+                    pipe.set(key, data, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Unable to persist {len(pending)} chat sessions: {e}")
+            for key, data in pending.items():
+                self.pending.setdefault(key, data)
+
+    async def __flush_soon(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+
+def create_session_store() -> SessionStore:
+    if settings.session_store == "redis":
+        return RedisSessionStore(
+            settings.session_store_url, ttl=settings.session_idle_ttl
+        )
+
+    return SessionStore()
@@ -0,0 +1,199 @@
+import asyncio
+import re
+import time
+from typing import List, Optional
+
+from config import settings
+
+from ..utils.ai_logger import logger
+from .ai.llm import llm_service
+from .ai.scheduler import Priority
+from .ai.speech_conversion_service import speech_service
+from .conversation import count_tokens
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s']")
+
+
+def normalize_transcript(text: str) -> str:
+    return " ".join(PUNCTUATION_PATTERN.sub(" ", text.lower()).split())
+
+
+class SpeculationStats:
+    def __init__(self):
+        self.transcriptions = 0
+        self.reused_transcripts = 0
+        self.replies_started = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_prompt_tokens = 0
+        self.wasted_completion_tokens = 0
+
+    def stats(self) -> dict:
+        adopted = self.hits + self.misses
+        return {
+            "transcriptions": self.transcriptions,
+            "reused_transcripts": self.reused_transcripts,
+            "replies_started": self.replies_started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / adopted if adopted else 0,
+            "wasted_prompt_tokens": self.wasted_prompt_tokens,
+            "wasted_completion_tokens": self.wasted_completion_tokens,
+        }
+
+
+speculation_stats = SpeculationStats()
+
+
+class SpeculativeReply:
+    def __init__(self, message: str, messages: List[dict], memory_tail, step_name: str):
+        self.message = message
+        self.messages = messages
+        self.memory_tail = memory_tail
+        self.deltas = []
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self.__generate(step_name))
+        speculation_stats.replies_started += 1
+
+    def __repr__(self) -> str:
+        return f"<SpeculativeReply: {self.message!r}>"
+
+    async def __generate(self, step_name: str):
+        try:
+            # A guess shouldn't take LLM slots from turns that are really happening.
+            async for delta in llm_service.stream_chat_completion(
+                self.messages, step_name=step_name, priority=Priority.BACKGROUND
+            ):
+                self.deltas.append(delta)
+                self.queue.put_nowait(delta)
+        except Exception as e:
+            self.queue.put_nowait(e)
+        else:
+            self.queue.put_nowait(None)
+
+    async def replay(self):
+        try:
+            while (delta := await self.queue.get()) is not None:
+                if isinstance(delta, Exception):
+                    raise delta
+                yield delta
+        finally:
+            self.task.cancel()
+
+    def claim(self, memory_tail) -> bool:
+        # The reply was generated against the conversation as it was; it's only
+        # valid if no other turn has been added since.
+        if memory_tail is not self.memory_tail:
+            speculation_stats.misses += 1
+            self.discard()
+            return False
+        speculation_stats.hits += 1
+        return True
+
+    def discard(self):
+        if self.task.done() and not self.deltas:
+            return
+        self.task.cancel()
+        speculation_stats.wasted_prompt_tokens += sum(
+            count_tokens(message["content"]) for message in self.messages
+        )
+        speculation_stats.wasted_completion_tokens += count_tokens("".join(self.deltas))
+
+
+class SpeculativeTranscriber:
+    # Transcribes the upload as it grows and starts the reply for the latest partial
+    # transcript. If the final transcript turns out the same, the LLM call is already
+    # under way; otherwise the speculative reply is thrown away.
+    def __init__(self, chatbot, filename: str):
+        self.chatbot = chatbot
+        self.filename = filename
+        self.chunks = []
+        self.size = 0
+        self.started = 0.0
+        self.transcription = None
+        self.pending_size = 0
+        self.transcribed_size = 0
+        self.transcript = None
+        self.reply = None
+
+    def __repr__(self) -> str:
+        return f"<SpeculativeTranscriber: {self.size} bytes>"
+
+    def feed(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+
+        if self.transcription is not None and not self.transcription.done():
+            return
+        if self.size < settings.speculative_min_bytes:
+            return
+        if time.monotonic() - self.started < settings.speculative_interval_seconds:
+            return
+
+        self.started = time.monotonic()
+        self.pending_size = self.size
+        self.transcription = asyncio.create_task(
+            self.__transcribe(b"".join(self.chunks), self.size)
+        )
+
+    async def __transcribe(self, audio: bytes, size: int):
+        speculation_stats.transcriptions += 1
+        try:
+            transcript = await speech_service.speech_to_text(
+                audio,
+                self.filename,
+                step_name=f"User({self.chatbot.user_id}): Speculative Transcription",
+                priority=Priority.BACKGROUND,
+            )
+        except Exception as e:
+            logger.debug(
+                f"User({self.chatbot.user_id}): Speculative transcription failed: {e}"
+            )
+            return
+        self.transcript, self.transcribed_size = transcript, size
+
+        if not normalize_transcript(transcript):
+            return
+        if self.reply is not None:
+            if normalize_transcript(self.reply.message) == normalize_transcript(
+                transcript
+            ):
+                return
+            self.reply.discard()
+        self.reply = await self.chatbot.speculate(transcript)
+
+    async def final_transcript(self) -> Optional[str]:
+        # A transcription that already covers the whole upload makes a final one redundant.
+        if (
+            self.transcription is not None
+            and not self.transcription.done()
+            and self.pending_size == self.size
+        ):
+            await self.transcription
+
+        if self.transcript is not None and self.transcribed_size == self.size:
+            speculation_stats.reused_transcripts += 1
+            return self.transcript
+        return None
+
+    def adopt(self, transcript: str) -> Optional[SpeculativeReply]:
+        if self.transcription is not None:
+            self.transcription.cancel()
+        reply, self.reply = self.reply, None
+        if reply is None:
+            return None
+
+        # Counted as a hit once the turn claims the reply, which can still fail.
+        if normalize_transcript(reply.message) == normalize_transcript(transcript):
+            return reply
+
+        speculation_stats.misses += 1
+        reply.discard()
+        return None
+
+    def close(self):
+        if self.transcription is not None:
+            self.transcription.cancel()
+        if self.reply is not None:
+            self.reply.discard()
+            self.reply = None
@@ -0,0 +1,65 @@
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n+")
+CLAUSE_END = re.compile(r"[,;:](?=\s)")
+
+
+def find_segment_end(text: str, min_length: int, clause_length: int) -> Optional[int]:
+    for match in SENTENCE_END.finditer(text):
+        if match.end() >= min_length:
+            return match.end()
+
+    for match in CLAUSE_END.finditer(text):
+        if match.end() >= clause_length:
+            return match.end()
+
+    return None
+
+
+async def split_sentences(
+    deltas: AsyncIterator[str], min_length: int = 12, clause_length: int = 60
+) -> AsyncIterator[str]:
+    buffer = ""
+    async for delta in deltas:
+        buffer += delta
+        while (end := find_segment_end(buffer, min_length, clause_length)) is not None:
+            segment, buffer = buffer[:end].strip(), buffer[end:]
+            if segment:
+                yield segment
+
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def synthesize_in_order(
+    segments: AsyncIterator[str],
+    synthesize: Callable[[str], Awaitable[bytes]],
+    max_concurrency: int,
+) -> AsyncIterator[bytes]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pending: asyncio.Queue = asyncio.Queue()
+
+    async def run(segment: str) -> bytes:
+        async with semaphore:
+            return await synthesize(segment)
+
+    async def produce():
+        try:
+            async for segment in segments:
+                await pending.put(asyncio.create_task(run(segment)))
+        finally:
+            await pending.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (task := await pending.get()) is not None:
+            yield await task
+        await producer
+    finally:
+        producer.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
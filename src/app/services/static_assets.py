@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+
+from ..utils.ai_logger import logger
+from ..utils.capabilities import is_package_installed
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "image/svg",
+)
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class StaticAsset:
+    def __init__(self, name: str, content: bytes, mtime: float):
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        stem, dot, extension = name.rpartition(".")
+        self.name = name
+        self.hashed_name = f"{stem}.{digest}.{extension}" if dot else f"{name}.{digest}"
+        self.media_type = guess_type(name)[0] or "application/octet-stream"
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.mtime = int(mtime)
+        self.variants = {None: (content, f'"{digest}"')}
+
+        if self.media_type.startswith(COMPRESSIBLE_TYPES):
+            self.__add_variant("gzip", gzip.compress(content, 9, mtime=0), digest)
+            if is_package_installed("brotli"):
+                import brotli
+
+                self.__add_variant("br", brotli.compress(content, quality=11), digest)
+
+    def __add_variant(self, encoding: str, content: bytes, digest: str):
+        if len(content) < len(self.variants[None][0]):
+            self.variants[encoding] = (content, f'"{digest}-{encoding}"')
+
+
+class StaticAssetStore:
+    def __init__(self, directory: str, exclude: tuple = ()):
+        self.directory = directory
+        self.exclude = exclude
+        self.assets = {}
+        self.routes = {}
+
+    def load(self):
+        assets = {}
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                if name in self.exclude:
+                    continue
+                with open(path, "rb") as f:
+                    assets[name] = StaticAsset(name, f.read(), os.path.getmtime(path))
+
+        # Plain names stay reachable for references that can't be fingerprinted
+        # (e.g. URLs built in script.js), but must be revalidated on every use.
+        self.assets = assets
+        self.routes = {}
+        for asset in assets.values():
+            self.routes[asset.name] = (asset, REVALIDATE)
+            self.routes[asset.hashed_name] = (asset, IMMUTABLE)
+        logger.debug(f"Loaded {len(assets)} static assets from {self.directory}")
+
+    def url_for(self, name: str) -> str:
+        asset = self.assets.get(name)
+        return f"/{asset.hashed_name}" if asset is not None else f"/{name}"
+
+    def response(self, request: Request, path: str) -> Response:
+        # Only preloaded assets can be served, so the path never reaches the filesystem.
+        route = self.routes.get(path)
+        if route is None:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        asset, cache_control = route
+        accept_encoding = request.headers.get("accept-encoding", "")
+        encoding = self.__pick_encoding(asset, accept_encoding)
+        content, etag = asset.variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if self.__not_modified(request, asset, etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content, media_type=asset.media_type, headers=headers)
+
+    @staticmethod
+    def __pick_encoding(asset: StaticAsset, accept_encoding: str) -> Optional[str]:
+        accepted = {
+            coding.split(";")[0].strip().lower()
+            for coding in accept_encoding.split(",")
+            if not coding.strip().endswith(";q=0")
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in asset.variants:
+                return encoding
+        return None
+
+    @staticmethod
+    def __not_modified(request: Request, asset: StaticAsset, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return asset.mtime <= since
+        return False
+
+
+static_assets = StaticAssetStore("app/templates", exclude=("index.html",))
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from config import settings
+
+from ..utils.ai_logger import logger
+
+
+class SummaryQueue:
+    def __init__(self, max_concurrency: int, max_pending: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_pending = max_pending
+        self.tasks = {}
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable]) -> bool:
+        if key in self.tasks:
+            return False
+
+        if len(self.tasks) >= self.max_pending:
+            self.dropped += 1
+            logger.debug(f"Summary queue is full, skipping summarization for {key}")
+            return False
+
+        self.tasks[key] = asyncio.create_task(self.__run(key, job))
+        return True
+
+    async def close(self):
+        tasks, self.tasks = list(self.tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    async def __run(self, key: Hashable, job: Callable[[], Awaitable]):
+        try:
+            async with self.semaphore:
+                await job()
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Background summarization failed for {key}: {e}")
+        finally:
+            self.tasks.pop(key, None)
+
+
+summary_queue = SummaryQueue(
+    max_concurrency=settings.summary_max_concurrency,
+    max_pending=settings.summary_max_pending,
+)
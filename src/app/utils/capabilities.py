@@ -0,0 +1,43 @@
+import importlib
+import importlib.util
+import time
+import types
+from functools import lru_cache
+
+OPTIONAL_CAPABILITIES = {
+    "silero_vad": "Silero voice activity detection",
+    "brotli": "Brotli-compressed static assets",
+    "redis": "Redis session store",
+}
+
+import_times = {}
+
+
+@lru_cache(maxsize=None)
+def is_package_installed(package_name: str) -> bool:
+    try:
+        return importlib.util.find_spec(package_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def capability_report() -> dict:
+    return {name: is_package_installed(name) for name in OPTIONAL_CAPABILITIES}
+
+
+@lru_cache(maxsize=None)
+def import_module(name: str) -> types.ModuleType:
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - started
+    return module
+
+
+class LazyModule(types.ModuleType):
+    # Stands in for a heavy SDK until one of its attributes is first used.
+    def __getattr__(self, attribute: str):
+        return getattr(import_module(self.__name__), attribute)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    return LazyModule(name)
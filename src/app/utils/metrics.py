@@ -0,0 +1,96 @@
+import bisect
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+from app.utils.ai_logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        escaped = escaped.replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), sum and count.
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        bucket_names = (*self.labelnames, "le")
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(bucket_names, (*labels, bound))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{series_labels} {total}")
+            lines.append(f"{self.name}_count{series_labels} {count}")
+        return lines
+
+
+def render_gauges(prefix: str, stats: dict) -> list[str]:
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}"
+        if isinstance(value, dict):
+            lines.extend(render_gauges(name, value))
+        elif isinstance(value, (int, float)):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {float(value)}")
+    return lines
+
+
+stage_duration = Histogram(
+    "voicebot_stage_duration_seconds",
+    "Time spent in each stage of a conversation turn.",
+    labelnames=("stage", "persona", "model"),
+)
+
+
+def observe_stage(stage: str, persona: str, model: str, seconds: float):
+    stage_duration.observe(seconds, stage, persona, model)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            json.dumps(
+                {"stage": stage, "persona": persona, "model": model, "seconds": seconds}
+            )
+        )
+
+
+@contextmanager
+def stage_span(stage: str, persona: str, model: str = ""):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, persona, model, time.perf_counter() - started)
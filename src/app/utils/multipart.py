@@ -0,0 +1,112 @@
+from email.message import Message
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Request
+
+HEADER_END = b"\r\n\r\n"
+MAX_HEADER_SIZE = 16 * 1024
+
+
+def get_header_param(
+    value: str, param: str, header: str = "content-type"
+) -> Optional[str]:
+    message = Message()
+    message[header] = value
+    return message.get_param(param, header=header)
+
+
+def malformed_upload(reason: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"Malformed upload: {reason}")
+
+
+async def limit_size(
+    stream: AsyncIterator[bytes], max_size: int
+) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload exceeds the maximum size of {max_size} bytes.",
+            )
+        yield chunk
+
+
+async def iter_multipart_field(
+    stream: AsyncIterator[bytes], boundary: str, field_name: str
+) -> AsyncIterator[bytes]:
+    # The body starts with "--boundary", so a leading CRLF lets every boundary,
+    # including the first one, be matched against the same delimiter.
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    buffer = bytearray(b"\r\n")
+    in_field = False
+    chunks = aiter(stream)
+
+    async def fill() -> bool:
+        chunk = await anext(chunks, None)
+        if chunk is None:
+            return False
+        buffer.extend(chunk)
+        return True
+
+    while True:
+        # Stream out field data up to the next delimiter, holding back just enough
+        # bytes to recognize a delimiter split across two chunks.
+        while (index := buffer.find(delimiter)) == -1:
+            keep = len(buffer) - len(delimiter) + 1
+            if keep > 0:
+                if in_field:
+                    yield bytes(buffer[:keep])
+                del buffer[:keep]
+            if not await fill():
+                raise malformed_upload("missing closing boundary")
+
+        if in_field:
+            if index:
+                yield bytes(buffer[:index])
+            return
+
+        del buffer[: index + len(delimiter)]
+        while len(buffer) < 2:
+            if not await fill():
+                raise malformed_upload("missing closing boundary")
+        if buffer.startswith(b"--"):
+            raise malformed_upload(f"no '{field_name}' field")
+
+        while (end := buffer.find(HEADER_END)) == -1:
+            if len(buffer) > MAX_HEADER_SIZE or not await fill():
+                raise malformed_upload("invalid part headers")
+
+        headers = buffer[:end].decode("latin-1").split("\r\n")
+        del buffer[: end + len(HEADER_END)]
+
+        for header in headers:
+            name, _, value = header.partition(":")
+            if name.strip().lower() == "content-disposition":
+                in_field = (
+                    get_header_param(value, "name", header="content-disposition")
+                    == field_name
+                )
+
+
+def read_upload(
+    request: Request, max_size: int, field_name: str
+) -> AsyncIterator[bytes]:
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload exceeds the maximum size of {max_size} bytes.",
+        )
+
+    stream = limit_size(request.stream(), max_size)
+
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return stream
+
+    boundary = get_header_param(content_type, "boundary")
+    if not boundary:
+        raise malformed_upload("missing multipart boundary")
+    return iter_multipart_field(stream, boundary, field_name)
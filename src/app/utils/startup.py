@@ -0,0 +1,24 @@
+import time
+from contextlib import contextmanager
+
+from .capabilities import capability_report, import_times
+
+startup_steps = {}
+
+
+@contextmanager
+def startup_step(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_steps[name] = time.perf_counter() - started
+
+
+def startup_report() -> dict:
+    return {
+        "steps": dict(startup_steps),
+        "total": sum(startup_steps.values()),
+        "imports": dict(import_times),
+        "capabilities": capability_report(),
+    }
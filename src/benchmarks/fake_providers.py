@@ -0,0 +1,210 @@
+import asyncio
+import io
+import json
+import random
+import time
+import wave
+
+import grpc
+import uvicorn
+from google.cloud import texttospeech as tts
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+REPLY = (
+    "Sure, I can help with that. Chime keeps your team conversations in one place. "
+    "You can start a group chat from the sidebar. Is there anything else you need?"
+)
+TRANSCRIPT = "How do I start a group chat with my team?"
+
+
+class ProviderProfile:
+    def __init__(self, latency: float, jitter: float, error_rate: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self) -> float:
+        return max(0, random.gauss(self.latency, self.latency * self.jitter))
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def silent_wav(seconds: float, sample_rate: int = 24000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\0\0" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+def silent_mp3(seconds: float) -> bytes:
+    # MPEG-2 Layer III frames at 24 kHz and 32 kbps, close to what the real API
+    # returns. All-zero side info and main data decode as silence.
+    frame = bytes([0xFF, 0xF3, 0x44, 0xC0]) + bytes(92)
+    return frame * max(1, round(seconds * 24000 / 576))
+
+
+def silent_ogg_opus(seconds: float) -> bytes:
+    # Imported here so the app's settings are only loaded once the benchmark has
+    # set the environment.
+    from app.services.ai.audio_formats import OGG_BOS, OGG_EOS, OggPage
+
+    # One 20 ms silent frame, padded out to 80 bytes (32 kbps): TOC for a single
+    # CELT frame with padding, the padding length, the frame, then the padding.
+    packet = bytes([0xFB, 0x41, 75, 0xFF, 0xFE]) + bytes(75)
+    head = b"OpusHead" + bytes([1, 1]) + (312).to_bytes(2, "little")
+    head += (24000).to_bytes(4, "little") + bytes(3)
+    tags = b"OpusTags" + (9).to_bytes(4, "little") + b"benchmark" + bytes(4)
+
+    pages = [
+        OggPage(OGG_BOS, 0, 1, bytes([len(head)]), head),
+        OggPage(0, 0, 1, bytes([len(tags)]), tags),
+    ]
+    packets = max(1, round(seconds * 50))
+    # 50 packets (one second) per page, like libopus.
+    for first in range(0, packets, 50):
+        count = min(50, packets - first)
+        pages.append(
+            OggPage(
+                OGG_EOS if first + count == packets else 0,
+                312 + (first + count) * 960,
+                1,
+                bytes([len(packet)]) * count,
+                packet * count,
+            )
+        )
+    return b"".join(page.encode(sequence) for sequence, page in enumerate(pages))
+
+
+def create_groq_app(
+    llm: ProviderProfile, stt: ProviderProfile, token_interval: float
+) -> Starlette:
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(llm.delay())
+        if llm.should_fail():
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error"}},
+                status_code=503,
+            )
+
+        async def events():
+            created = int(time.time())
+            for index, word in enumerate(REPLY.split(" ")):
+                chunk = {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": word if index == 0 else f" {word}"},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_interval)
+
+            final = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def transcriptions(request: Request):
+        await request.body()
+        await asyncio.sleep(stt.delay())
+        if stt.should_fail():
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error"}},
+                status_code=503,
+            )
+        return JSONResponse(
+            {
+                "task": "transcribe",
+                "language": "english",
+                "duration": 2.0,
+                "text": TRANSCRIPT,
+                "segments": [],
+            }
+        )
+
+    return Starlette(
+        routes=[
+            Route("/chat/completions", chat_completions, methods=["POST"]),
+            Route("/audio/transcriptions", transcriptions, methods=["POST"]),
+        ]
+    )
+
+
+def create_tts_server(profile: ProviderProfile, address: str) -> grpc.aio.Server:
+    # Short words map to proportionally short clips, roughly like real speech.
+    async def synthesize_speech(request, context):
+        await asyncio.sleep(profile.delay())
+        if profile.should_fail():
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Injected failure")
+        seconds = len(request.input.text) / 15
+        encoding = request.audio_config.audio_encoding
+        if encoding == tts.AudioEncoding.MP3:
+            audio = silent_mp3(seconds)
+        elif encoding == tts.AudioEncoding.OGG_OPUS:
+            audio = silent_ogg_opus(seconds)
+        else:
+            audio = silent_wav(seconds, request.audio_config.sample_rate_hertz or 24000)
+        return tts.SynthesizeSpeechResponse(audio_content=audio)
+
+    handler = grpc.method_handlers_generic_handler(
+        "google.cloud.texttospeech.v1.TextToSpeech",
+        {
+            "SynthesizeSpeech": grpc.unary_unary_rpc_method_handler(
+                synthesize_speech,
+                request_deserializer=tts.SynthesizeSpeechRequest.deserialize,
+                response_serializer=tts.SynthesizeSpeechResponse.serialize,
+            )
+        },
+    )
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((handler,))
+    server.add_insecure_port(address)
+    return server
+
+
+async def serve(
+    groq_port: int,
+    tts_port: int,
+    llm: ProviderProfile,
+    stt: ProviderProfile,
+    tts_profile: ProviderProfile,
+    token_interval: float,
+):
+    tts_server = create_tts_server(tts_profile, f"127.0.0.1:{tts_port}")
+    await tts_server.start()
+
+    config = uvicorn.Config(
+        create_groq_app(llm, stt, token_interval),
+        host="127.0.0.1",
+        port=groq_port,
+        log_level="warning",
+    )
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        await tts_server.stop(grace=None)
+
+
+def run_fake_providers(*args):
+    asyncio.run(serve(*args))
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import re
+import resource
+import socket
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_providers import ProviderProfile, run_fake_providers  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"Fake provider did not start on port {port}")
+
+
+def rss_megabytes() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def tone_wav(seconds: float) -> bytes:
+    from app.services.ai.streaming_vad import SAMPLE_RATE, pcm_to_wav
+
+    samples = (
+        int(12000 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)).to_bytes(
+            2, "little", signed=True
+        )
+        for i in range(int(seconds * SAMPLE_RATE))
+    )
+    return pcm_to_wav(b"".join(samples))
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = Counter()
+        self.requests = 0
+
+    def record(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def record_response(self, name: str, status_code: int, seconds: float):
+        self.requests += 1
+        self.statuses[status_code] += 1
+        if status_code < 400:
+            self.record(name, seconds)
+
+
+async def run_session(app, recorder, persona, turns, audio, assets, audio_format=None):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        started = time.perf_counter()
+        response = await client.get("/", params={"persona": persona})
+        recorder.record_response(
+            "ui_index", response.status_code, time.perf_counter() - started
+        )
+
+        for asset in assets:
+            started = time.perf_counter()
+            response = await client.get(asset, headers={"Accept-Encoding": "gzip, br"})
+            recorder.record_response(
+                "ui_asset", response.status_code, time.perf_counter() - started
+            )
+
+        params = {"persona": persona}
+        if audio_format:
+            params["format"] = audio_format
+        for _ in range(turns):
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/upload_stream",
+                params=params,
+                files={"audio": ("audio.wav", audio, "audio/wav")},
+            )
+            recorder.record_response(
+                "turn", response.status_code, time.perf_counter() - started
+            )
+
+
+async def run_benchmark(args) -> dict:
+    from main import create_app
+
+    from app.services.persona import personas
+    from app.utils.metrics import stage_duration
+
+    recorder = Recorder()
+
+    # Capture raw stage timings alongside the histogram so percentiles are exact.
+    observe = stage_duration.observe
+
+    def record_stage(value, stage, *labels):
+        recorder.record(f"stage:{stage}", value)
+        observe(value, stage, *labels)
+
+    stage_duration.observe = record_stage
+
+    app = create_app()
+    audio = tone_wav(args.utterance_seconds)
+    persona_names = list(personas)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited_session(index, assets):
+        async with semaphore:
+            await run_session(
+                app,
+                recorder,
+                persona_names[index % len(persona_names)],
+                args.turns,
+                audio,
+                assets,
+                args.audio_format,
+            )
+
+    async with app.router.lifespan_context(app):
+        import httpx
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            index_page = (await client.get("/")).text
+        assets = re.findall(r'(?:href|src)="(/[^"]+)"', index_page)
+
+        # Provider SDKs are imported on first use; keep that out of the measurements.
+        for index in range(args.warmup):
+            await run_session(
+                app,
+                Recorder(),
+                persona_names[index % len(persona_names)],
+                1,
+                audio,
+                assets,
+                args.audio_format,
+            )
+        recorder.samples.clear()
+
+        rss_before = rss_megabytes()
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(limited_session(index, assets) for index in range(args.sessions))
+        )
+        elapsed = time.perf_counter() - started
+        rss_after = rss_megabytes()
+
+    return {
+        "elapsed": elapsed,
+        "requests": recorder.requests,
+        "statuses": dict(recorder.statuses),
+        "samples": recorder.samples,
+        "rss_before": rss_before,
+        "rss_after": rss_after,
+        "rss_peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(result: dict):
+    print(f"\n{'metric':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, samples in sorted(result["samples"].items()):
+        print(
+            f"{name:<24}{len(samples):>8}"
+            + "".join(
+                f"{percentile(samples, fraction) * 1000:>10.1f}"
+                for fraction in (0.5, 0.95, 0.99)
+            )
+        )
+
+    print(
+        f"\n{result['requests']} requests in {result['elapsed']:.2f}s "
+        f"({result['requests'] / result['elapsed']:.1f} req/s), statuses: {result['statuses']}"
+    )
+    print(
+        f"RSS: {result['rss_before']:.1f} MB before, {result['rss_after']:.1f} MB after "
+        f"({result['rss_after'] - result['rss_before']:+.1f} MB), "
+        f"peak {result['rss_peak']:.1f} MB"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the voicebot API against local fake AI providers."
+    )
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Unmeasured sessions to run first"
+    )
+    parser.add_argument("--utterance-seconds", type=float, default=2.0)
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.2, help="Time to first token"
+    )
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--tts-latency", type=float, default=0.15)
+    parser.add_argument(
+        "--jitter", type=float, default=0.2, help="Latency stddev as a fraction"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--vad", action="store_true", help="Run Silero VAD if installed"
+    )
+    parser.add_argument(
+        "--audio-format",
+        choices=("opus", "mp3", "wav"),
+        help="Reply format to request (default: the server's TTS_DEFAULT_AUDIO_FORMAT)",
+    )
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="Keep the per-session rate limits, which throttle the simulated sessions",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    groq_port, tts_port = free_port(), free_port()
+
+    # Settings are read when config is first imported, so the environment has to
+    # point at the fake providers before the app (or the providers process) loads it.
+    os.environ.update(
+        {
+            "GROQ_API_KEY": "benchmark",
+            "GROQ_API_BASE": f"http://127.0.0.1:{groq_port}",
+            "GOOGLE_SERVICE_CREDENTIALS": "{}",
+            "TTS_EMULATOR_HOST": f"127.0.0.1:{tts_port}",
+            "VAD_ENABLED": str(args.vad).lower(),
+            "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        }
+    )
+    if not args.rate_limits:
+        os.environ.update(
+            {"RATE_LIMIT_REQUESTS_PER_MINUTE": "0", "RATE_LIMIT_MAX_IN_FLIGHT": "0"}
+        )
+
+    providers = multiprocessing.Process(
+        target=run_fake_providers,
+        args=(
+            groq_port,
+            tts_port,
+            ProviderProfile(args.llm_latency, args.jitter, args.error_rate),
+            ProviderProfile(args.stt_latency, args.jitter, args.error_rate),
+            ProviderProfile(args.tts_latency, args.jitter, args.error_rate),
+            args.token_interval,
+        ),
+        daemon=True,
+    )
+    providers.start()
+
+    try:
+        wait_for_port(groq_port)
+        wait_for_port(tts_port)
+        print_report(asyncio.run(run_benchmark(args)))
+    finally:
+        providers.terminate()
+        providers.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import List, Literal, Optional
 
 from pydantic import DirectoryPath
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -13,6 +14,21 @@ class GroqCompletionModelEnum(str, Enum):
     MIXTRAL_8X7B = "groq/mixtral-8x7b-32768"
     GEMMA_7B = "groq/gemma-7b-it"
 
+    @property
+    def context_window(self) -> int:
+        return COMPLETION_MODEL_CONTEXT_WINDOWS[self]
+
+
+COMPLETION_MODEL_CONTEXT_WINDOWS = {
+    GroqCompletionModelEnum.LLAMA_8B: 131072,
+    GroqCompletionModelEnum.LLAMA_70B: 131072,
+    GroqCompletionModelEnum.LLAMA_3_8B: 8192,
+    GroqCompletionModelEnum.LLAMA_3_70B: 8192,
+    GroqCompletionModelEnum.LLAMA_2: 4096,
+    GroqCompletionModelEnum.MIXTRAL_8X7B: 32768,
+    GroqCompletionModelEnum.GEMMA_7B: 8192,
+}
+
 
 class GroqTranscriptionModelEnum(str, Enum):
     DISTILL_WHISPER = "groq/distil-whisper-large-v3-en"
@@ -21,13 +37,91 @@ class GroqTranscriptionModelEnum(str, Enum):
 
 class Settings(BaseSettings):
     groq_api_key: str
+    groq_api_base: Optional[str] = None
     debug_mode: bool = False
     google_service_credentials: str
+    tts_emulator_host: Optional[str] = None
     media_path: DirectoryPath = "media"
     llm_model_name: GroqCompletionModelEnum = GroqCompletionModelEnum.LLAMA_3_8B
     transcript_model_name: GroqTranscriptionModelEnum = (
         GroqTranscriptionModelEnum.DISTILL_WHISPER
     )
+    llm_fallback_models: List[GroqCompletionModelEnum] = [
+        GroqCompletionModelEnum.LLAMA_8B
+    ]
+    transcript_fallback_models: List[GroqTranscriptionModelEnum] = [
+        GroqTranscriptionModelEnum.WHISPER_LARGE
+    ]
+    llm_timeout: float = 20
+    llm_max_retries: int = 2
+    llm_hedge: bool = False
+    stt_timeout: float = 20
+    stt_max_retries: int = 2
+    stt_hedge: bool = False
+    tts_timeout: float = 10
+    tts_max_retries: int = 2
+    tts_hedge: bool = False
+    retry_base_delay: float = 0.2
+    retry_max_delay: float = 2
+    upload_max_bytes: int = 25 * 1024 * 1024
+    tts_default_audio_format: Literal["opus", "mp3", "wav"] = "mp3"
+    tts_sample_rate_hertz: Optional[int] = None
+    tts_max_concurrency: int = 3
+    tts_max_upstream_concurrency: int = 8
+    tts_requests_per_minute: int = 0
+    tts_characters_per_minute: int = 0
+    tts_max_queue: int = 64
+    tts_client_pool_size: int = 2
+    tts_token_refresh_margin: int = 300
+    tts_cache_max_bytes: int = 32 * 1024 * 1024
+    tts_cache_max_text_length: int = 200
+    tts_cache_disk: bool = False
+    tts_cache_disk_max_bytes: int = 512 * 1024 * 1024
+    session_max_entries: int = 10000
+    session_max_bytes: int = 256 * 1024 * 1024
+    session_idle_ttl: int = 3600
+    session_sweep_interval: int = 60
+    session_store: Literal["memory", "redis"] = "memory"
+    session_store_url: str = "redis://localhost:6379/0"
+    rate_limit_requests_per_minute: int = 20
+    rate_limit_burst: int = 5
+    rate_limit_max_in_flight: int = 1
+    rate_limit_paths: List[str] = ["/api/upload_stream", "/api/chat_stream"]
+    rate_limit_store: Literal["memory", "redis"] = "memory"
+    rate_limit_store_url: Optional[str] = None
+    summary_max_concurrency: int = 4
+    summary_max_pending: int = 100
+    memory_max_messages: int = 50
+    prompt_token_budget: int = 2048
+    llm_completion_token_reserve: int = 512
+    llm_variant_pool_size: int = 5
+    llm_max_concurrency: int = 16
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0
+    llm_max_queue: int = 64
+    stt_max_concurrency: int = 8
+    stt_requests_per_minute: int = 0
+    stt_max_queue: int = 32
+    prompts_path: Optional[DirectoryPath] = None
+    prompts_bytecode_cache_path: Optional[DirectoryPath] = None
+    knowledge_docs_path: Optional[str] = "knowledge"
+    knowledge_index_path: Optional[str] = None
+    knowledge_top_k: int = 3
+    knowledge_min_score: float = 0.15
+    knowledge_chunk_words: int = 120
+    knowledge_embedding_dimensions: int = 1024
+    knowledge_query_cache_size: int = 1024
+    knowledge_product_terms: List[str] = ["chime", "product", "app", "platform"]
+    vad_enabled: bool = True
+    vad_num_threads: int = 1
+    vad_max_batch_size: int = 8
+    vad_trim_padding_seconds: float = 0.2
+    speculative_transcription: bool = False
+    speculative_interval_seconds: float = 1.0
+    speculative_min_bytes: int = 16 * 1024
+    voice_ws_silence_seconds: float = 0.6
+    voice_ws_max_utterance_seconds: float = 30
+    voice_ws_max_idle_seconds: float = 10
 
     model_config = SettingsConfigDict(env_file=".env")
 
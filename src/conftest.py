@@ -0,0 +1,7 @@
+import os
+
+# Settings are read at import time and these two have no defaults; tests never
+# call the real providers.
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("GOOGLE_SERVICE_CREDENTIALS", "{}")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
@@ -1,22 +1,55 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import api, ui
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.routers import api, metrics, ui
+from app.services.ai.tts_client_pool import tts_client_pool
+from app.services.ai.vad_service import vad_service
+from app.services.chat_session_cache import CHATBOT_CACHE
+from app.services.knowledge_base import knowledge_base
+from app.services.rate_limiter import rate_limiter
+from app.services.static_assets import static_assets
+from app.services.summary_queue import summary_queue
 from app.utils.ai_logger import logger
-from app.utils.check_package import is_package_installed
+from app.utils.capabilities import import_module
+from app.utils.startup import startup_report, startup_step
+from config import settings
+
+
+def log_preload_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            f"Unable to import litellm in the background: {future.exception()}"
+        )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.debug("Loading silero vad models...")
-    if is_package_installed("silero_vad"):
-        from silero_vad import load_silero_vad
+    with startup_step("static_assets"):
+        static_assets.load()
+    with startup_step("knowledge_base"):
+        knowledge_base.load()
+    with startup_step("vad"):
+        await vad_service.load()
+    with startup_step("tts_client_pool"):
+        await tts_client_pool.start()
+    CHATBOT_CACHE.start_sweeper()
 
-        model = load_silero_vad()
+    # litellm is by far the slowest import; finish it in the background so the
+    # server starts accepting connections without waiting for it.
+    preload = asyncio.get_running_loop().run_in_executor(None, import_module, "litellm")
+    preload.add_done_callback(log_preload_failure)
+    logger.debug(f"Startup report: {startup_report()}")
     yield
+    await summary_queue.close()
+    await CHATBOT_CACHE.close()
+    await tts_client_pool.close()
+    await vad_service.close()
+    await rate_limiter.close()
 
 
 def create_app():
@@ -27,6 +60,8 @@ def create_app():
         "http://localhost:8000",
     ]
 
+    # Added before CORS so that 429 responses still carry the CORS headers.
+    app.add_middleware(RateLimitMiddleware, paths=settings.rate_limit_paths)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=origins,
@@ -36,6 +71,7 @@ def create_app():
     )
 
     app.include_router(api.router, prefix="/api")
+    app.include_router(metrics.router)
     app.include_router(ui.router)
 
     return app
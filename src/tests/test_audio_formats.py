@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services.ai.audio_formats import (
+    OGG_BOS,
+    OGG_EOS,
+    OGG_PAGE_HEADER,
+    OggPage,
+    join_ogg_opus_segments,
+    ogg_crc,
+)
+
+# TOC byte for a single 20 ms CELT frame, 960 samples at 48 kHz.
+OPUS_PACKET = bytes([19 << 3]) + b"\x00" * 40
+
+
+def opus_file(serial: int, packets: int, trim: int = 0) -> bytes:
+    pages = [
+        OggPage(OGG_BOS, 0, serial, bytes([19]), b"OpusHead" + b"\x00" * 11),
+        OggPage(0, 0, serial, bytes([16]), b"OpusTags" + b"\x00" * 8),
+    ]
+    for index in range(packets):
+        flags = OGG_EOS if index == packets - 1 else 0
+        granule = 960 * (index + 1) - (trim if flags else 0)
+        pages.append(
+            OggPage(flags, granule, serial, bytes([len(OPUS_PACKET)]), OPUS_PACKET)
+        )
+    return b"".join(page.encode(sequence) for sequence, page in enumerate(pages))
+
+
+def read_headers(data: bytes) -> list:
+    headers = []
+    offset = 0
+    while offset < len(data):
+        header = OGG_PAGE_HEADER.unpack_from(data, offset)
+        size = OGG_PAGE_HEADER.size + header[-1]
+        size += sum(data[offset + OGG_PAGE_HEADER.size : offset + size])
+        page = data[offset : offset + size]
+        assert ogg_crc(page[:22] + b"\x00" * 4 + page[26:]) == header[6]
+        headers.append(header)
+        offset += size
+    return headers
+
+
+def test_opus_segments_are_joined_into_one_logical_stream():
+    async def segments():
+        yield opus_file(serial=1, packets=3, trim=100)
+        yield b""
+        yield opus_file(serial=2, packets=2, trim=200)
+
+    async def join():
+        return b"".join([chunk async for chunk in join_ogg_opus_segments(segments())])
+
+    headers = read_headers(asyncio.run(join()))
+    flags = [header[2] for header in headers]
+    granules = [header[3] for header in headers]
+
+    assert len(headers) == 2 + 3 + 2
+    assert {header[4] for header in headers} == {1}
+    assert [header[5] for header in headers] == list(range(len(headers)))
+    assert flags[0] == OGG_BOS and flags[-1] == OGG_EOS and not any(flags[1:-1])
+    # Only the end of the joined stream is trimmed.
+    assert granules[2:] == [960, 1920, 2880, 3840, 4800 - 200]
@@ -0,0 +1,31 @@
+import asyncio
+
+from app.services.knowledge_base import KnowledgeBase
+from app.services.prompts import prompt_manager
+
+
+def search(tmp_path, query):
+    knowledge_base = KnowledgeBase(
+        str(tmp_path),
+        "knowledge",
+        top_k=3,
+        min_score=0.15,
+        query_cache_size=16,
+        product_terms=["chime", "product"],
+    )
+    knowledge_base.load()
+    return [chunk["title"] for chunk in asyncio.run(knowledge_base.search(query))]
+
+
+def test_search_matches_inflections(tmp_path):
+    assert search(tmp_path, "can I share files")[0] == "File sharing"
+
+
+def test_search_falls_back_to_overview_for_product_questions(tmp_path):
+    assert search(tmp_path, "tell me about the product") == ["Chime"]
+    assert search(tmp_path, "what's the weather like") == []
+
+
+def test_system_prompt_names_persona():
+    prompt = prompt_manager.get_prompt("system_prompt", {"persona": "Alice"})
+    assert "You are Alice," in prompt
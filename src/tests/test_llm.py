@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import litellm
+import pytest
+from fastapi import HTTPException
+
+from app.services.ai import llm
+from app.services.ai.llm import llm_service
+from app.services.ai.resilience import llm_policy
+from app.services.ai.scheduler import TokenBucket, llm_scheduler
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def chunk(content: str):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=content))]
+    )
+
+
+class FakeStream:
+    def __init__(self, deltas, delay=0.0, stall_after=None):
+        self.deltas = list(deltas)
+        self.delay = delay
+        self.stall_after = stall_after
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.stall_after is not None and self.sent >= self.stall_after:
+            await asyncio.sleep(100)
+        if self.sent == len(self.deltas):
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)
+        self.sent += 1
+        return chunk(self.deltas[self.sent - 1])
+
+    async def aclose(self):
+        self.closed = True
+
+
+def serve(monkeypatch, *streams):
+    remaining = list(streams)
+
+    async def acompletion(**kwargs):
+        return remaining.pop(0)
+
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+
+
+def test_stalled_stream_times_out_and_is_closed(monkeypatch):
+    monkeypatch.setattr(llm_policy, "timeout", 0.3)
+    stream = FakeStream(["hi", " there"], stall_after=1)
+    serve(monkeypatch, stream)
+    deltas = []
+
+    async def run():
+        async for delta in llm_service.stream_chat_completion(MESSAGES, "test"):
+            deltas.append(delta)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 504
+    assert deltas == ["hi"]
+    assert stream.closed
+    assert llm_scheduler.stats()["active"] == 0
+
+
+def test_slow_consumer_does_not_use_up_the_timeout(monkeypatch):
+    monkeypatch.setattr(llm_policy, "timeout", 0.3)
+    serve(monkeypatch, FakeStream(["one", " two", " three", " four"], delay=0.01))
+
+    async def run():
+        deltas = []
+        async for delta in llm_service.stream_chat_completion(MESSAGES, "test"):
+            deltas.append(delta)
+            # A slow client: far longer in total than the provider timeout.
+            await asyncio.sleep(0.15)
+        return deltas
+
+    assert asyncio.run(run()) == ["one", " two", " three", " four"]
+
+
+def test_cancelled_caller_hands_a_coalesced_call_to_its_waiters(monkeypatch):
+    streams = [FakeStream(["first"], delay=0.2), FakeStream(["second"], delay=0.05)]
+    serve(monkeypatch, *streams)
+    messages = [{"role": "user", "content": "coalesce me"}]
+
+    async def run():
+        owner = asyncio.create_task(llm_service.chat_completion(messages, "test"))
+        await asyncio.sleep(0.05)
+        waiters = [
+            asyncio.create_task(llm_service.chat_completion(messages, "test"))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        owner.cancel()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(run()) == ["second"] * 3
+    assert streams[0].closed
+    assert llm_scheduler.stats()["active"] == 0
+
+
+def test_prompt_is_only_tokenized_with_a_token_budget(monkeypatch):
+    counted = []
+
+    def token_counter(**kwargs):
+        counted.append(kwargs)
+        return 10
+
+    monkeypatch.setattr(litellm, "token_counter", token_counter)
+    serve(monkeypatch, FakeStream(["a"]), FakeStream(["b"]))
+
+    async def complete():
+        return [d async for d in llm_service.stream_chat_completion(MESSAGES, "test")]
+
+    asyncio.run(complete())
+    assert counted == []
+
+    monkeypatch.setattr(llm_scheduler, "token_bucket", TokenBucket(100000))
+    asyncio.run(complete())
+    assert len(counted) == 1
+
+
+def test_debug_log_of_the_response_does_not_delay_the_stream(monkeypatch):
+    rebuilt = threading.Event()
+
+    def stream_chunk_builder(chunks, messages):
+        time.sleep(0.3)
+        rebuilt.set()
+        return SimpleNamespace(model_dump_json=lambda: '{"content": "hi"}')
+
+    monkeypatch.setattr(litellm, "stream_chunk_builder", stream_chunk_builder)
+    monkeypatch.setattr(llm.logger, "isEnabledFor", lambda level: True)
+    serve(monkeypatch, FakeStream(["hi"]))
+
+    async def run():
+        started = time.monotonic()
+        async for _ in llm_service.stream_chat_completion(MESSAGES, "test"):
+            pass
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.2
+    assert rebuilt.wait(1)
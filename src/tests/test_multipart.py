@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.multipart import iter_multipart_field
+
+BOUNDARY = "----boundary123"
+AUDIO = b"RIFF\x00\x01\r\n------boundary12\r\n--" + bytes(range(256)) * 4
+
+
+def multipart_body(*parts, preamble: bytes = b"") -> bytes:
+    body = preamble
+    for name, data in parts:
+        body += (
+            (
+                f"--{BOUNDARY}\r\n"
+                f'Content-Disposition: form-data; name="{name}"; filename="{name}.wav"\r\n'
+                "Content-Type: application/octet-stream\r\n\r\n"
+            ).encode()
+            + data
+            + b"\r\n"
+        )
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def read_field(body: bytes, chunk_size: int, field_name: str = "audio") -> bytes:
+    async def stream():
+        for start in range(0, len(body), chunk_size):
+            yield body[start : start + chunk_size]
+
+    async def read():
+        chunks = iter_multipart_field(stream(), BOUNDARY, field_name)
+        return b"".join([chunk async for chunk in chunks])
+
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_field_is_extracted_whatever_the_chunking(chunk_size):
+    body = multipart_body(("other", b"ignored"), ("audio", AUDIO))
+    assert read_field(body, chunk_size) == AUDIO
+
+
+def test_preamble_is_skipped():
+    body = multipart_body(
+        ("audio", AUDIO), preamble=b"This is a multi-part message.\r\n"
+    )
+    assert read_field(body, 3) == AUDIO
+
+
+def test_boundary_like_bytes_in_the_payload_are_kept():
+    # Everything short of CRLF followed by the full delimiter is data.
+    payload = f"--{BOUNDARY}\r\n--{BOUNDARY[:-1]}".encode() + b"\r\n--" + AUDIO
+    assert read_field(multipart_body(("audio", payload)), 1) == payload
+
+
+def test_missing_field_is_a_bad_request():
+    with pytest.raises(HTTPException) as error:
+        read_field(multipart_body(("other", AUDIO)), 5)
+    assert error.value.status_code == 400
+    assert "no 'audio' field" in error.value.detail
+
+
+def test_truncated_body_is_a_bad_request():
+    body = multipart_body(("audio", AUDIO))
+    with pytest.raises(HTTPException) as error:
+        read_field(body[: len(body) // 2], 16)
+    assert error.value.status_code == 400
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from google.api_core.exceptions import InvalidArgument, ServiceUnavailable
+
+from app.services.ai.resilience import ResiliencePolicy
+
+
+def create_policy(timeout=5, max_retries=2):
+    return ResiliencePolicy(
+        "test",
+        timeout=timeout,
+        max_retries=max_retries,
+        hedge=False,
+        base_delay=0,
+        max_delay=0,
+    )
+
+
+class FlakyProvider:
+    def __init__(self, failures: dict):
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self, target: str) -> str:
+        self.calls.append(target)
+        if self.failures.get(target, 0) > 0:
+            self.failures[target] -= 1
+            raise ServiceUnavailable(f"{target} is down")
+        return f"served by {target}"
+
+
+def test_retryable_errors_are_retried():
+    policy = create_policy()
+    provider = FlakyProvider({"primary": 2})
+
+    result = asyncio.run(policy.call(provider, ["primary"], "step"))
+
+    assert result == "served by primary"
+    assert provider.calls == ["primary"] * 3
+    assert policy.stats()["served_by"] == {"retry": 1}
+
+
+def test_fallback_is_used_once_retries_run_out():
+    policy = create_policy(max_retries=1)
+    provider = FlakyProvider({"primary": 5})
+
+    result = asyncio.run(policy.call(provider, ["primary", "fallback"], "step"))
+
+    assert result == "served by fallback"
+    assert provider.calls == ["primary", "primary", "fallback"]
+    assert policy.stats()["served_by"] == {"fallback": 1}
+
+
+def test_last_error_is_raised_when_every_target_fails():
+    policy = create_policy(max_retries=0)
+    provider = FlakyProvider({"primary": 1, "fallback": 1})
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(policy.call(provider, ["primary", "fallback"], "step"))
+    assert policy.stats()["failures"] == 1
+
+
+def test_other_errors_are_not_retried():
+    policy = create_policy()
+    calls = []
+
+    async def operation(target):
+        calls.append(target)
+        raise InvalidArgument("bad request")
+
+    with pytest.raises(InvalidArgument):
+        asyncio.run(policy.call(operation, ["primary", "fallback"], "step"))
+    assert calls == ["primary"]
+
+
+def test_deadline_covers_the_whole_step():
+    policy = create_policy(timeout=0.2)
+    provider = FlakyProvider({})
+
+    async def slow(target):
+        await asyncio.sleep(1)
+        return await provider(target)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(policy.call(slow, ["primary", "fallback"], "step"))
+    assert error.value.status_code == 504
+    assert policy.stats()["timeouts"] == 1
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.ai.scheduler import Priority, ProviderScheduler
+
+
+def create_scheduler(max_concurrency=1, max_queue=10):
+    return ProviderScheduler(
+        "test",
+        max_concurrency=max_concurrency,
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_queue=max_queue,
+    )
+
+
+def test_interactive_requests_are_served_before_background_ones():
+    async def run():
+        scheduler = create_scheduler()
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire()
+        tasks = [
+            asyncio.create_task(request("summary 1", Priority.BACKGROUND)),
+            asyncio.create_task(request("summary 2", Priority.BACKGROUND)),
+            asyncio.create_task(request("reply 1", Priority.INTERACTIVE)),
+            asyncio.create_task(request("reply 2", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 4
+
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(run())
+    # Same-priority requests keep their arrival order.
+    assert order == ["reply 1", "reply 2", "summary 1", "summary 2"]
+    assert stats["active"] == 0
+
+
+def test_full_queue_sheds_load_with_503():
+    async def run():
+        scheduler = create_scheduler(max_queue=2)
+        await scheduler.acquire()
+        waiters = [asyncio.create_task(scheduler.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as error:
+            await scheduler.acquire()
+
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return error.value, scheduler.stats()
+
+    error, stats = asyncio.run(run())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+    assert stats["rejected"] == 1
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        scheduler = create_scheduler()
+        await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        scheduler.release()
+        await asyncio.wait_for(scheduler.acquire(), 1)
+        return scheduler.stats()
+
+    assert asyncio.run(run())["active"] == 1
@@ -0,0 +1,67 @@
+import asyncio
+
+import fakeredis
+
+from app.services.chat_session_cache import ChatSessionCache
+from app.services.session_store import RedisSessionStore, SessionStore
+
+
+def create_cache(store, max_bytes=1024 * 1024):
+    return ChatSessionCache(
+        max_entries=1000, max_bytes=max_bytes, idle_ttl=3600, store=store
+    )
+
+
+def create_redis_store(server):
+    store = RedisSessionStore("redis://localhost:6379/0", ttl=60)
+    store.client = fakeredis.FakeAsyncRedis(server=server)
+    return store
+
+
+def test_memory_store_does_not_outlive_byte_limit():
+    async def run():
+        cache = create_cache(SessionStore(), max_bytes=5000)
+        for index in range(200):
+            chatbot = await cache.get_or_create_session(f"user{index}", "Alice")
+            chatbot.memory.append("user", "hello there " * 10)
+            await chatbot.save_state()
+
+        assert cache.total_bytes <= 5000
+        assert cache.evictions["bytes"] > 0
+
+        # Evicted sessions are gone rather than restored from a hidden snapshot.
+        chatbot = await cache.get_or_create_session("user0", "Alice")
+        assert len(chatbot.memory) == 0
+
+    asyncio.run(run())
+
+
+def test_redis_store_shares_sessions_between_workers():
+    async def run():
+        server = fakeredis.FakeServer()
+        first_worker = create_cache(create_redis_store(server))
+        second_worker = create_cache(create_redis_store(server))
+
+        chatbot = await first_worker.get_or_create_session("user", "Alice")
+        chatbot.memory.append("user", "hi")
+        chatbot.memory.append("assistant", "hey")
+        chatbot.current_summary = "greetings"
+        await chatbot.save_state()
+        await first_worker.store.flush()
+
+        restored = await second_worker.get_or_create_session("user", "Alice")
+        assert [message.content for message in restored.memory] == ["hi", "hey"]
+        assert restored.current_summary == "greetings"
+
+        # A cached session is reloaded, so it picks up turns taken on another worker.
+        restored.memory.append("user", "bye")
+        await restored.save_state()
+        await second_worker.store.flush()
+
+        chatbot = await first_worker.get_or_create_session("user", "Alice")
+        assert [message.content for message in chatbot.memory] == ["hi", "hey", "bye"]
+
+        await first_worker.close()
+        await second_worker.close()
+
+    asyncio.run(run())
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.services import chatbot as chatbot_module
+from app.services import speculation
+from app.services.ai.scheduler import Priority
+from app.services.chatbot import Chatbot
+from app.services.persona import personas
+from app.services.speculation import SpeculativeReply, SpeculativeTranscriber
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = speculation.SpeculationStats()
+    monkeypatch.setattr(speculation, "speculation_stats", stats)
+    return stats
+
+
+@pytest.fixture
+def priorities(monkeypatch):
+    priorities = []
+
+    async def stream_chat_completion(
+        messages, step_name, priority=Priority.INTERACTIVE
+    ):
+        priorities.append(priority)
+        yield "sure, "
+        yield "here you go"
+
+    monkeypatch.setattr(
+        speculation.llm_service, "stream_chat_completion", stream_chat_completion
+    )
+    return priorities
+
+
+def speculate(message: str, memory_tail=None) -> SpeculativeTranscriber:
+    transcriber = SpeculativeTranscriber(chatbot=None, filename="audio.ogg")
+    messages = [{"role": "user", "content": message}]
+    transcriber.reply = SpeculativeReply(message, messages, memory_tail, "test")
+    return transcriber
+
+
+def test_matching_transcript_is_a_hit_once_claimed(stats, priorities):
+    async def run():
+        transcriber = speculate("Can I share files?")
+        reply = transcriber.adopt("can i share files")
+        assert reply is not None and stats.hits == 0
+        assert reply.claim(None)
+        return "".join([delta async for delta in reply.replay()])
+
+    assert asyncio.run(run()) == "sure, here you go"
+    assert (stats.hits, stats.misses) == (1, 0)
+    assert priorities == [Priority.BACKGROUND]
+
+
+def test_different_transcript_is_a_miss(stats, priorities):
+    async def run():
+        transcriber = speculate("Can I share files?")
+        await asyncio.sleep(0)
+        return transcriber.adopt("can I share photos")
+
+    assert asyncio.run(run()) is None
+    assert (stats.hits, stats.misses) == (0, 1)
+    assert stats.wasted_prompt_tokens > 0
+
+
+def test_stale_reply_is_a_miss_not_a_hit(stats, priorities):
+    async def run():
+        transcriber = speculate("Can I share files?", memory_tail=None)
+        await asyncio.sleep(0)
+        reply = transcriber.adopt("can I share files")
+        # Another turn finished between the guess and this one.
+        return reply.claim(object())
+
+    assert asyncio.run(run()) is False
+    assert (stats.hits, stats.misses) == (0, 1)
+    assert stats.wasted_prompt_tokens > 0
+
+
+def test_silence_is_checked_before_a_speculative_transcript_is_used(
+    stats, priorities, monkeypatch
+):
+    async def is_silent(audio):
+        return True
+
+    monkeypatch.setattr(
+        type(chatbot_module.vad_service), "is_loaded", property(lambda self: True)
+    )
+    monkeypatch.setattr(chatbot_module.vad_service, "is_silent", is_silent)
+    chatbot = Chatbot(personas["Alice"], "user")
+
+    async def run():
+        transcriber = speculate("Thank you for watching!")
+        transcriber.transcript = "Thank you for watching!"
+        transcriber.transcribed_size = transcriber.size
+        audio = await chatbot.voice_respond(
+            b"...", "audio.ogg", speculation=transcriber
+        )
+        await audio.aclose()
+
+    asyncio.run(run())
+    assert stats.reused_transcripts == 0
+    assert stats.misses == 1
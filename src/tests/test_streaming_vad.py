@@ -0,0 +1,119 @@
+import asyncio
+import io
+import math
+import struct
+import subprocess
+import wave
+
+import pytest
+
+from app.services.ai import streaming_vad
+from app.services.ai.streaming_vad import (
+    FFMPEG_PATH,
+    SAMPLE_RATE,
+    Endpointer,
+    StreamingVAD,
+    pcm_to_wav,
+)
+
+
+async def energy_timestamps(wav):
+    # Stands in for Silero: 32 ms frames louder than a threshold are speech.
+    timestamps = []
+    start = None
+    for offset in range(0, len(wav), 512):
+        loud = float(wav[offset : offset + 512].abs().mean()) > 0.05
+        if loud and start is None:
+            start = offset
+        elif not loud and start is not None:
+            timestamps.append({"start": start, "end": offset})
+            start = None
+    if start is not None:
+        timestamps.append({"start": start, "end": len(wav)})
+    return timestamps
+
+
+def pcm(seconds: float, speech: bool) -> bytes:
+    return b"".join(
+        struct.pack(
+            "<h",
+            int(16000 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)) if speech else 0,
+        )
+        for i in range(int(seconds * SAMPLE_RATE))
+    )
+
+
+def wav_seconds(audio: bytes) -> float:
+    with wave.open(io.BytesIO(audio)) as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def run_endpointer(monkeypatch, *frames):
+    monkeypatch.setattr(
+        streaming_vad.vad_service, "speech_timestamps", energy_timestamps
+    )
+
+    async def run():
+        endpointer = Endpointer(
+            silence_seconds=0.6, max_utterance_seconds=30, max_idle_seconds=10
+        )
+        try:
+            for frame in frames:
+                endpointer.feed(frame)
+            # No more frames arrive; the endpoint has to come from the tracker.
+            await asyncio.sleep(0.2)
+            utterances = []
+            while not endpointer.utterances.empty():
+                utterances.append(endpointer.utterances.get_nowait())
+            return utterances
+        finally:
+            endpointer.close()
+
+    return asyncio.run(run())
+
+
+def test_pause_between_words_does_not_end_the_utterance(monkeypatch):
+    utterances = run_endpointer(
+        monkeypatch, pcm(0.5, False), pcm(0.6, True), pcm(0.45, False), pcm(0.6, True)
+    )
+    assert utterances == []
+
+
+def test_utterance_ends_after_the_full_silence(monkeypatch):
+    utterances = run_endpointer(
+        monkeypatch,
+        pcm(0.5, False),
+        pcm(0.6, True),
+        pcm(0.45, False),
+        pcm(0.6, True),
+        pcm(1.0, False),
+    )
+    assert len(utterances) == 1
+    # Both words, the pause and the trim padding on either side.
+    assert 1.6 < wav_seconds(utterances[0]) < 2.2
+
+
+@pytest.mark.skipif(FFMPEG_PATH is None, reason="ffmpeg is not installed")
+def test_trimmed_speech_is_smaller_than_a_compressed_upload(monkeypatch):
+    monkeypatch.setattr(
+        streaming_vad.vad_service, "speech_timestamps", energy_timestamps
+    )
+    monkeypatch.setattr(StreamingVAD, "is_available", classmethod(lambda cls: True))
+    upload = subprocess.run(
+        [FFMPEG_PATH, "-loglevel", "error", "-i", "pipe:0", "-c:a", "libopus"]
+        + ["-b:a", "32k", "-f", "ogg", "pipe:1"],
+        input=pcm_to_wav(pcm(2, False) + pcm(1.5, True) + pcm(3, False)),
+        capture_output=True,
+        check=True,
+    ).stdout
+
+    async def run():
+        vad = await StreamingVAD.start()
+        for start in range(0, len(upload), 4096):
+            await vad.feed(upload[start : start + 4096])
+        return await vad.finish(upload, "ogg")
+
+    activity = asyncio.run(run())
+    assert activity.speech_detected
+    assert activity.extension == "ogg"
+    assert len(activity.audio) < len(upload) / 1.5
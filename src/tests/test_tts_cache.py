@@ -0,0 +1,38 @@
+import asyncio
+import os
+
+from app.services.ai.tts_cache import TTSCache
+
+
+def test_concurrent_writes_of_the_same_entry_do_not_collide(tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr(
+        "app.services.ai.tts_cache.logger.error", lambda message: errors.append(message)
+    )
+    cache = TTSCache(max_bytes=1024, disk_path=str(tmp_path), disk_max_bytes=1024)
+
+    async def run():
+        await asyncio.gather(*(cache.set("greeting", b"audio") for _ in range(5)))
+
+    asyncio.run(run())
+    assert errors == []
+    assert os.listdir(tmp_path) == ["greeting"]
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = TTSCache(max_bytes=0, disk_path=str(tmp_path), disk_max_bytes=250)
+
+    async def run():
+        await cache.set("first", b"1" * 100)
+        await cache.set("second", b"2" * 100)
+        assert await cache.get("first") == b"1" * 100
+        await cache.set("third", b"3" * 100)
+
+    asyncio.run(run())
+    assert sorted(os.listdir(tmp_path)) == ["first", "third"]
+    assert cache.stats()["disk_bytes"] == 200
+
+    # A restarted worker picks the files up and keeps to a smaller limit too.
+    restarted = TTSCache(max_bytes=0, disk_path=str(tmp_path), disk_max_bytes=150)
+    assert restarted.stats()["disk_entries"] == 1
+    assert len(os.listdir(tmp_path)) == 1